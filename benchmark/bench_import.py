@@ -0,0 +1,57 @@
+"""Measure the startup cost of `import naapc` with `python -X importtime`.
+
+Usage:
+    python benchmark/bench_import.py [--budget-ms 100] [--repeat 5]
+
+The best of `repeat` fresh interpreters is reported. Exits with 1 when the cumulative import time of naapc is over
+the budget or when a serializer (yaml, json) is loaded at import time.
+"""
+import argparse
+import subprocess
+import sys
+
+DEFERRED_MODULES = ("yaml", "json")
+
+
+def measure_import_time(module: str = "naapc") -> dict[str, tuple[int, int]]:
+    """Return {imported module: (self us, cumulative us)} of importing module in a fresh interpreter."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    res = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        res[name.strip()] = (int(self_us), int(cumulative_us))
+    return res
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [measure_import_time() for _ in range(args.repeat)]
+    best = min(runs, key=lambda r: r["naapc"][1])
+    own = sum(v[0] for k, v in best.items() if k.startswith("naapc"))
+    total = best["naapc"][1]
+    print(f"import naapc: {total / 1000:.2f} ms cumulative, {own / 1000:.2f} ms in naapc modules")
+
+    ok = True
+    loaded = [m for m in DEFERRED_MODULES if m in best]
+    if loaded:
+        print(f"serializers loaded at import time: {loaded}")
+        ok = False
+    if total > args.budget_ms * 1000:
+        print(f"over budget: {total / 1000:.2f} ms > {args.budget_ms:.2f} ms")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Payload size and round-trip time of pickling nested dictionaries.
+
+Usage:
+    python benchmark/bench_pickle.py [--branches 200] [--leaves 50] [--depth 3] [--repeat 5]
+
+Compares the compact pickle of ndict/snd (nested dict only, index rebuilt on load) with pickling the nested dict
+and the string keyed flatten dict together, which is what a plain __dict__ pickle of ndict used to carry.
+"""
+import argparse
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from naapc import ndict, snd
+
+
+def make_config(branches: int, leaves: int, depth: int) -> dict:
+    def subtree(level: int) -> dict:
+        if level == depth:
+            return {f"leaf_{i}": i * 0.5 for i in range(leaves)}
+        return {f"level{level}_{i}": subtree(level + 1) for i in range(2)}
+
+    return {f"branch_{i}": subtree(1) for i in range(branches)}
+
+
+def best_of(repeat: int, func) -> float:
+    res = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        res = min(res, perf_counter() - start)
+    return res
+
+
+def identity(x):
+    return x
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--branches", type=int, default=200)
+    parser.add_argument("--leaves", type=int, default=50)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw = make_config(args.branches, args.leaves, args.depth)
+    nd = ndict(raw)
+    print(f"{len(nd.flatten_dict)} leaves")
+
+    cases = {
+        "dict + flatten dict": {"dict": nd.dict, "flatten_dict": dict(nd.flatten_dict)},
+        "ndict": nd,
+        "snd": snd(raw),
+    }
+    for name, obj in cases.items():
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+        t = best_of(args.repeat, lambda: pickle.loads(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)))
+        print(f"{name:>20}: {len(payload) / 1024:9.1f} KiB, round trip {t * 1000:8.2f} ms")
+
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        pool.submit(identity, None).result()
+        t = best_of(args.repeat, lambda: pool.submit(identity, nd).result())
+    print(f"{'ndict via process':>20}: round trip {t * 1000:8.2f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
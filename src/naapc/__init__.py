@@ -1,8 +1,21 @@
 from typing import Union
 
+from .array_layout import ArrayLayout
+from .intern import InternPool
+from .instrumentation import disable_stats, enable_stats, reset_stats, stats
 from .ndict import ndict
 from .snd import snd
+from .table import NDictTable
 
 NestedOrDict = Union[ndict, dict]
 
 __version__ = "2.1.1"
+
+
+def __getattr__(name: str):
+    # Loaded on first use to keep multiprocessing out of the import time.
+    if name == "SharedNDict":
+        from .shared import SharedNDict
+
+        return SharedNDict
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from numbers import Real
+from typing import Any
+
+
+def import_numpy() -> Any:
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("NumPy is required for array export, install it with `pip install naapc[numpy]`.") from e
+    return numpy
+
+
+def is_numeric(value: Any) -> bool:
+    return isinstance(value, Real) and not isinstance(value, bool)
+
+
+class ArrayLayout:
+    """Mapping between array positions and leaf paths.
+
+    Position i of the array holds the leaf at paths[i]. The Python type of each leaf is recorded so that values
+    written back keep their type (integers are rounded).
+
+    Args:
+        path_lists (list[tuple[str, ...]]): Split paths of the leaves.
+        types (list[type]): Types of the leaves.
+        delimiter (str): Path separator used to render the paths.
+    """
+
+    __slots__ = ("path_lists", "types", "paths", "_positions")
+
+    def __init__(self, path_lists: list[tuple[str, ...]], types: list[type], delimiter: str) -> None:
+        assert len(path_lists) == len(types)
+        self.path_lists = path_lists
+        self.types = types
+        self.paths = [delimiter.join(p) for p in path_lists]
+        self._positions = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __repr__(self) -> str:
+        return f"<ArrayLayout of {len(self)} leaves.>"
+
+    def index(self, path: str) -> int:
+        """Position of a path in the array."""
+        if self._positions is None:
+            self._positions = {p: i for i, p in enumerate(self.paths)}
+        return self._positions[path]
+
+    def cast(self, values: list) -> list:
+        """Convert array values back to the types of the leaves."""
+        return [
+            t(round(v)) if t is int else v if t is float else t(v) for t, v in zip(self.types, values)
+        ]
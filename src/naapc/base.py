@@ -1,32 +1,59 @@
 from __future__ import annotations
 
-import json
 from abc import ABC, abstractclassmethod, abstractmethod, abstractproperty
+from contextlib import contextmanager
+from copy import deepcopy
 from functools import reduce
-from operator import getitem
-from typing import Any, Optional, Union
+from operator import getitem, itemgetter
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, Iterator, Optional, Union
 
-import yaml
-
-from .dict_traverse import traverse
+from .array_layout import ArrayLayout, import_numpy, is_numeric
+from .collectors import (
+    Collector,
+    FlattenCollector,
+    KeysCollector,
+    PathsCollector,
+    SizeCollector,
+    ValuesCollector,
+)
+from .dict_traverse import TraversalPlan, traverse
+from .interpolation import Resolver
+from .path_index import PathKey, split_path
 
 
 class NestedBase(ABC):
     DEFAULT_DELIMITER = ";"
+    MERGE_STRATEGIES = ["override", "keep", "append", "error"]
 
     def __init__(
         self,
         d: Optional[Union[dict, NestedBase]] = None,
         delimiter: Optional[str] = None,
         return_nested: bool = True,
+        list_paths: bool = False,
     ):
         assert delimiter is None or isinstance(
             delimiter, (str)
         ), f"delimiter must be str, but recieved {type(delimiter)}"
 
+        # Cached nested objects of attribute style access.
+        self._children = {}
+        # Cached top level keys for positional access.
+        self._key_list = None
+        # Cached layout of all numeric leaves.
+        self._array_layout = None
+        # Reference graph and resolved values of ${path} templates.
+        self._resolver = None
+        # Paths written in the current batch block (None outside of one) and the rollback data.
+        self._batch = None
+        self._undo = None
+
         # Public attributes
         self.return_nested = return_nested
         self._delimiter = delimiter or self.DEFAULT_DELIMITER
+        # Lists are branches whose elements are addressed by index components, e.g. "layers;3;dim".
+        self._list_paths = bool(list_paths)
 
         self._d = {}
         if d is not None:
@@ -44,11 +71,57 @@ class NestedBase(ABC):
         d: Optional[dict] = None,
         delimiter: Optional[str] = None,
         return_nested: bool = True,
+        list_paths: bool = False,
     ) -> NestedBase:
         if states is None:
             assert d is not None and delimiter
             states = {"dict": d, "delimiter": delimiter}
-        return cls(return_nested=return_nested).load_states(states)
+        return cls(return_nested=return_nested, list_paths=list_paths).load_states(states)
+
+    @classmethod
+    def load_flat(
+        cls,
+        fp: Union[str, Path, IO[str]],
+        format: str = "jsonl",
+        delimiter: Optional[str] = None,
+        **configs,
+    ) -> NestedBase:
+        """Rebuild an object from a file written by dump_flat in one streaming pass.
+
+        Args:
+            fp (Union[str, Path, IO[str]]): File path or text file object.
+            format (str): "jsonl", "csv" or "tsv". Defaults to "jsonl".
+            delimiter (Optional[str]): Path separator used in the file. Defaults to None, which means the default one.
+            configs: Other construction options, e.g. return_nested or list_paths. See from_leaves.
+        """
+        from .flat_io import read_flat
+
+        delimiter = delimiter or cls.DEFAULT_DELIMITER
+        leaves = ((split_path(path, delimiter), value) for path, value in read_flat(fp, format))
+        return cls.from_leaves(leaves, delimiter=delimiter, **configs)
+
+    @classmethod
+    def from_leaves(
+        cls, leaves: Iterable[tuple[tuple[str, ...], Any]], delimiter: Optional[str] = None, **configs
+    ) -> NestedBase:
+        """Build an object from (components tuple, leaf) pairs in one pass.
+
+        The nested dictionary is built directly and adopted, the leaves aren't normalized. With list_paths,
+        dictionaries whose keys are exactly "0", "1", ... are restored as lists.
+        """
+        d = {}
+        for path_list, value in leaves:
+            node = d
+            for k in path_list[:-1]:
+                node = node.setdefault(k, {})
+                if not isinstance(node, dict):
+                    raise ValueError(f"{path_list} is below the leaf {k}.")
+            node[path_list[-1]] = value
+        res = cls(delimiter=delimiter, **configs)
+        if res.list_paths:
+            _restore_lists(d)
+        res._adopt_dict(d)
+        return res
 
     @abstractproperty
     def raw_is_plain(self) -> bool:
@@ -57,14 +130,7 @@ class NestedBase(ABC):
     @property
     def paths(self) -> list[str]:
         """Get all possible paths."""
-
-        def _path_action(tree: dict, res: list[str], node: Any, path: str, depth: int):
-            if path is not None:
-                res.append(path)
-
-        res = []
-        traverse(tree=self.dict, res=res, actions=_path_action)
-        return res
+        return self._collect([PathsCollector(self._delimiter)])[0]
 
     @property
     def delimiter(self) -> str:
@@ -73,6 +139,8 @@ class NestedBase(ABC):
     @delimiter.setter
     def delimiter(self, delimiter: str) -> None:
         self._delimiter = delimiter
+        # References are written with the delimiter.
+        self._resolver = None
 
     @property
     def return_nested(self) -> bool:
@@ -82,54 +150,87 @@ class NestedBase(ABC):
     def return_nested(self, value: bool) -> None:
         self._return_nested = bool(value)
 
+    @property
+    def list_paths(self) -> bool:
+        return self._list_paths
+
     @property
     def dict(self) -> dict:
         return self._d
 
     @property
     def configs(self) -> dict:
-        return {"return_nested": self.return_nested}
+        return {"return_nested": self.return_nested, "list_paths": self._list_paths}
 
     @property
     def flatten_dict(self) -> dict:
         return self._get_flatten_dict()
 
-    def __getitem__(self, key: Union[str, int]) -> Any:
-        path = key if isinstance(key, str) else list(self.keys())[key]
-        return self._dict_nested_conversion_before_return(path, self._get_node(path))
+    def __getitem__(self, key: Union[PathKey, int, slice]) -> Any:
+        """Value of a path. Integers and slices index the top level keys in insertion order."""
+        if isinstance(key, (str, tuple, list)):
+            path, path_list = key, self._split(key)
+        elif isinstance(key, slice):
+            return [self[(k,)] for k in self._top_keys()[key]]
+        else:
+            path = self._top_keys()[key]
+            path_list = (path,)
+        return self._dict_nested_conversion_before_return(path, self._get_node(path_list))
 
     # Option to prevent overwriting.
-    def __setitem__(self, path: str, value: Any) -> Any:
-        if isinstance(value, dict):
-            value = self.__class__(d=value, delimiter=self._delimiter).dict
-        elif isinstance(value, NestedBase):
-            value = value.dict
-        elif isinstance(value, (list, tuple, set)):
-            value = value.__class__(
-                [
-                    self.__class__(d=x).dict if isinstance(x, (NestedBase, dict)) else x
-                    for x in value
-                ]
-            )
+    def __setitem__(self, path: PathKey, value: Any) -> Any:
+        value = self._normalize_value(value)
+        path_list = self._split(path)
+        self._before_write(path_list)
+        v = self._d
+        for node in path_list[:-1]:
+            if isinstance(v, list):
+                i = _list_index(v, node, append=True)
+                if i == len(v):
+                    v.append({})
+                elif not isinstance(v[i], (dict, list)):
+                    v[i] = {}
+                v = v[i]
+                continue
+            if node not in v or not (
+                isinstance(v[node], dict) or self._list_paths and isinstance(v[node], list)
+            ):
+                v[node] = {}
+            v = v[node]
+        _set_child(v, path_list[-1], value)
 
-        if self._delimiter not in path:
-            self._d[path] = value
-        else:
-            path_list = path.split(self._delimiter)
-            v = self._d
-            for node in path_list[:-1]:
-                if node not in v or not isinstance(v[node], dict):
-                    v[node] = {}
-                v = v[node]
-            v[path_list[-1]] = value
-
-    def __delitem__(self, path: str) -> None:
-        if self.delimiter not in path:
-            del self._d[path]
-            return
-        path_list = path.split(self._delimiter)
+    def __delitem__(self, path: PathKey) -> None:
+        path_list = self._split(path)
         parent = self._get_node(path_list[:-1])
-        del parent[path_list[-1]]
+        if self._list_paths and isinstance(parent, list):
+            i = _list_index(parent, path_list[-1])
+            # The following elements shift.
+            self._before_write(path_list[:-1])
+            del parent[i]
+        else:
+            _check_child(parent, path_list)
+            self._before_write(path_list, delete=True)
+            del parent[path_list[-1]]
+
+    def __getattr__(self, name: str) -> Any:
+        """Attribute style access to top level keys, e.g. nd.train.optim.lr.
+
+        Nested objects are cached per key, so chained access doesn't allocate after the first time. The cache entry
+        is dropped when the key is written or deleted through this object.
+        """
+        if name.startswith("_"):
+            raise AttributeError(name)
+        try:
+            val = self._d[name]
+        except KeyError:
+            raise AttributeError(f"{self.__class__.__name__} has no attribute or key {name!r}") from None
+        if not (self.return_nested and isinstance(val, dict)):
+            return val
+        child = self._children.get(name)
+        if child is None or child._d is not val:
+            child = self._dict_nested_conversion_before_return(name, val)
+            self._children[name] = child
+        return child
 
     def __len__(self) -> int:
         return len(self._d)
@@ -137,11 +238,17 @@ class NestedBase(ABC):
     def __bool__(self) -> bool:
         return bool(self._d)
 
-    def __contains__(self, path: str) -> bool:
-        nodes = path.split(self._delimiter)
+    def __contains__(self, path: PathKey) -> bool:
+        if self._list_paths:
+            try:
+                self._get_node(self._split(path))
+            except (KeyError, TypeError):
+                return False
+            return True
+        nodes = self._split(path)
         d = self.dict
         for n in nodes:
-            if n not in d:
+            if not isinstance(d, dict) or n not in d:
                 return False
             d = d[n]
         return True
@@ -150,79 +257,480 @@ class NestedBase(ABC):
         return self.dict == self.__class__(other).dict
 
     def __str__(self) -> str:
+        import yaml
+
         return yaml.dump(self.dict, sort_keys=False, indent=2)
 
     def __repr__(self) -> str:
         return f"<Nested dictionary of {len(self)} subtrees.>: {self.dict}"
 
+    def __getstate__(self) -> dict:
+        """Only the nested dictionary and the configurations are pickled. Derived data is rebuilt on load."""
+        return {"dict": self._d, "delimiter": self._delimiter, **self.configs}
+
+    def __setstate__(self, state: dict) -> None:
+        state = dict(state)
+        d = state.pop("dict")
+        self.__init__(**state)
+        self._adopt_dict(d)
+
     def json(self, indent=2, sort_keys=False) -> str:
+        import json
+
         return json.dumps(self._d, indent=indent, sort_keys=sort_keys)
 
+    def iter_flat(self, as_tuple: bool = False) -> Iterator[tuple[PathKey, Any]]:
+        """Yield (path, leaf) pairs in depth-first order straight from the traversal. Empty dictionaries are leaves."""
+        if as_tuple:
+            yield from self._iter_leaves()
+            return
+        join = self._delimiter.join
+        for path_list, v in self._iter_leaves():
+            yield join(path_list), v
+
+    def dump_flat(self, fp: Union[str, Path, IO[str]], format: str = "jsonl") -> int:
+        """Stream the leaves into a file without building flatten_dict.
+
+        Args:
+            fp (Union[str, Path, IO[str]]): File path or text file object.
+            format (str): "jsonl" writes {"path": path, "value": leaf} lines, "csv" and "tsv" write a path and a JSON
+                encoded value column. Defaults to "jsonl".
+
+        Returns:
+            int: The number of written leaves.
+        """
+        from .flat_io import write_flat
+
+        return write_flat(self.iter_flat(), fp, format)
+
     def states(self) -> dict:
         """Subclasses may provide more attributes."""
         return {"dict": self.dict, "delimiter": self.delimiter}
 
     def load_states(self, states: dict) -> NestedBase:
         self._d = states["dict"]
+        self._clear_caches()
         return self
 
     # TODO: Make it a generator.
-    def keys(self, max_depth: int = 1) -> list[str]:
-        """Return a list of leave and depth <= depth"""
-
-        def _keys_action(tree: dict, res: list[str], node: Any, path: str, depth: int):
-            if path is not None and (not isinstance(node, dict) or depth == max_depth):
-                res.append(path)
+    def keys(self, max_depth: int = 1, as_tuple: bool = False) -> list[PathKey]:
+        """Return a list of leave and depth <= depth
 
+        Args:
+            max_depth (int): Maximum depth. -1 means all depth. Defaults to 1.
+            as_tuple (bool): Return the paths as components tuples. Defaults to False.
+        """
         if max_depth == 1:
-            return list(self._d.keys())
-
-        res = []
-        traverse(tree=self._d, res=res, actions=_keys_action, depth=max_depth)
-        return res
+            return [(k,) for k in self._d] if as_tuple else list(self._d.keys())
+        return self._collect([KeysCollector(max_depth, as_tuple, self._delimiter)])[0]
 
     # TODO: Make it a generator.
     def values(self, max_depth: int = 1) -> list[Any]:
-        def _values_action(tree: dict, res: list[Any], node: Any, path: str, depth: int):
-            if path is not None and (not isinstance(node, dict) or depth == max_depth):
-                res.append(self._dict_nested_conversion_before_return(path, node))
-
-        res = []
-        traverse(tree=self._d, res=res, actions=_values_action, depth=max_depth)
-        return res
+        return self._collect([ValuesCollector(max_depth, self._dict_nested_conversion_before_return)])[0]
 
     # TODO: Make it a generator.
-    def items(self, max_depth: int = 1) -> list[tuple[str, Any]]:
-        return list(zip(self.keys(max_depth=max_depth), self.values(max_depth=max_depth)))
+    def items(self, max_depth: int = 1, as_tuple: bool = False) -> list[tuple[PathKey, Any]]:
+        return self.collect("items", max_depth=max_depth, as_tuple=as_tuple)[0]
 
-    def get(self, key: Union[str, int], default: Any = None) -> Any:
-        path = key if isinstance(key, str) else list(self.keys())[key]
+    def collect(
+        self,
+        *collectors: Union[str, Collector],
+        max_depth: int = 1,
+        as_tuple: bool = False,
+        ignore_none: bool = False,
+    ) -> tuple:
+        """Compute several views in a single walk of the tree. Lists are leaves here, as in keys and paths.
+
+        Args:
+            collectors (Union[str, Collector]): "paths", "flatten_dict", "keys", "values", "items", "size" or
+                Collector instances (see naapc.collectors).
+            max_depth (int): max_depth of keys, values, items and size. Defaults to 1.
+            as_tuple (bool): as_tuple of keys and items. Defaults to False.
+            ignore_none (bool): ignore_none of size. Defaults to False.
+
+        Returns:
+            tuple: The results in the order of collectors, e.g.
+                paths, size = nd.collect("paths", "size", max_depth=-1)
+        """
+        walk, outputs = [], []
+        for c in collectors:
+            if isinstance(c, Collector):
+                walk.append(c)
+                outputs.append(c)
+            elif c == "items":
+                keys = KeysCollector(max_depth, as_tuple, self._delimiter)
+                values = ValuesCollector(max_depth, self._dict_nested_conversion_before_return)
+                walk.extend((keys, values))
+                outputs.append((keys, values))
+            else:
+                walk.append(self._new_collector(c, max_depth, as_tuple, ignore_none))
+                outputs.append(walk[-1])
+        self._collect(walk)
+        return tuple(
+            list(zip(o[0].result, o[1].result)) if isinstance(o, tuple) else o.result for o in outputs
+        )
+
+    def get(self, key: Union[PathKey, int], default: Any = None) -> Any:
+        path = key if isinstance(key, (str, tuple, list)) else (self._top_keys()[key],)
         try:
             return self[path]
         except KeyError:
             return default
 
+    def compile_getter(self, paths: list[PathKey], bind: bool = True) -> Callable:
+        """Compile an accessor for a fixed list of paths.
+
+        The paths are split once at compile time. The values are read from the raw nested dictionary and returned as
+        they are, i.e. dictionaries are not converted to nested objects.
+
+        Args:
+            paths (list[PathKey]): Paths to read.
+            bind (bool): If True, the accessor takes no argument and reads the live dictionary of this object, so it
+                picks up later writes. Otherwise it takes the nested object or plain dict to read from.
+                Defaults to True.
+
+        Returns:
+            Callable: Accessor returning a tuple of values in the order of paths. A missing path raises KeyError.
+        """
+        compile_path = _compile_list_path_getter if self._list_paths else _compile_path_getter
+        getters = [compile_path(self._split(p)) for p in paths]
+
+        if bind:
+
+            def bound_getter() -> tuple:
+                d = self._d
+                return tuple([g(d) for g in getters])
+
+            return bound_getter
+
+        def getter(d: Union[dict, NestedBase]) -> tuple:
+            if isinstance(d, NestedBase):
+                d = d.dict
+            return tuple([g(d) for g in getters])
+
+        return getter
+
+    def set_many(self, items: Union[dict, Iterable[tuple[PathKey, Any]]]) -> None:
+        """Set several paths. items is a {path: value} dict or an iterable of (path, value) pairs."""
+        for p, v in items.items() if isinstance(items, dict) else items:
+            self[p] = v
+
     def update(self, d: Union[dict, NestedBase]) -> None:
-        flatten_dict = self.__class__(d).flatten_dict
-        for p, v in flatten_dict.items():
+        for p, v in self.__class__(d, delimiter=self._delimiter, **self.configs)._iter_leaves():
             self[p] = v
 
-    def size(self, max_depth: int = 1, ignore_none: bool = False) -> int:
-        def _size_action(tree: dict, res: list[int], node: Any, path: str, depth: int):
-            if (
-                path is not None
-                and (not isinstance(node, dict) or depth == max_depth)
-                and (not ignore_none or ignore_none and node is not None)
-            ):
-                res[0] += 1
+    def merge(
+        self, other: Union[dict, NestedBase], strategy: str = "override", copy: bool = True
+    ) -> NestedBase:
+        """Deep merge other into this object in place.
+
+        Both trees are walked together without recursion. Dictionaries present in both are merged, subtrees missing in
+        this object are adopted as a whole. Nothing is modified if a conflict raises.
+
+        Args:
+            other (Union[dict, NestedBase]): Tree to merge. Keys of a plain dict may be paths.
+            strategy (str): How to resolve a path present in both trees (unless both values are dictionaries):
+                "override" takes the value of other, "keep" keeps the existing value, "append" concatenates lists
+                (existing + other) and overrides otherwise, "error" raises ValueError if the values differ.
+                Defaults to "override".
+            copy (bool): Copy the adopted subtrees. If False, they are adopted by reference (zero-copy) and must be
+                normalized nested dictionaries. Defaults to True.
+
+        Returns:
+            NestedBase: self
+        """
+        assert strategy in self.MERGE_STRATEGIES, f"Unknown merge strategy: {strategy}."
+        is_plain = not isinstance(other, NestedBase)
+        other = other if is_plain else other.dict
+
+        # Plan first, so that a conflict doesn't leave a half merged tree. other is walked in order, so that the
+        # planned writes apply in the order of its keys.
+        ops = []
+        # {(id(parent), key): position in ops} of the planned writes. Path keys of other may reach the same key more
+        # than once, the later ones are then resolved against the planned value rather than the current one.
+        planned = {}
+        stack = [(self._d, iter(other.items()), ())]
+        while stack:
+            node, items, path_list = stack[-1]
+            item = next(items, None)
+            if item is None:
+                stack.pop()
+                continue
+            k, v = item
+            if is_plain and isinstance(k, str) and self._delimiter in k:
+                k, *rest = k.split(self._delimiter)
+                for c in reversed(rest):
+                    v = {c: v}
+            if (id(node), k) in planned:
+                i = planned[id(node), k]
+                cur = ops[i][2]
+                if not copy and isinstance(cur, dict) and isinstance(v, dict):
+                    # Planned by reference so far, copied before being merged into.
+                    cur = self._normalize_value(cur)
+                    ops[i] = ops[i][:2] + (cur,) + ops[i][3:]
+            elif k in node:
+                cur = node[k]
+            else:
+                planned[id(node), k] = len(ops)
+                ops.append((node, k, self._normalize_value(v) if copy else v, path_list + (k,)))
+                continue
+            if isinstance(cur, dict) and isinstance(v, dict):
+                stack.append((cur, iter(v.items()), path_list + (k,)))
+            elif strategy == "keep":
+                continue
+            elif strategy == "error":
+                if cur != v:
+                    p = self._delimiter.join(path_list + (k,))
+                    raise ValueError(f"Merge conflict at {p}: {cur!r} != {v!r}.")
+            else:
+                if strategy == "append" and isinstance(cur, list) and isinstance(v, list):
+                    v = cur + v
+                planned[id(node), k] = len(ops)
+                ops.append((node, k, self._normalize_value(v) if copy else v, path_list + (k,)))
+
+        for parent, k, v, path_list in ops:
+            self._merge_assign(parent, k, v, path_list)
+        return self
+
+    def map_leaves(
+        self,
+        fn: Callable[[Any], Any],
+        where: Optional[Callable[[str, Any], bool]] = None,
+        inplace: bool = True,
+    ) -> NestedBase:
+        """Replace every leaf (as in flatten_dict) by fn(leaf) in a single traversal.
+
+        Args:
+            fn (callable): Maps a leaf value to its new value.
+            where (Optional[callable]): where(path, value) selects the leaves to map. Defaults to None (all leaves).
+            inplace (bool): Modify this object, otherwise return a new one sharing the unchanged leaves.
+                Defaults to True.
+        """
+
+        def transform(path: str, value: Any) -> tuple[bool, Any]:
+            return True, fn(value) if where is None or where(path, value) else value
+
+        return self._transform_leaves(transform, inplace)
+
+    def filter_leaves(self, pred: Callable[[str, Any], bool], inplace: bool = True) -> NestedBase:
+        """Keep the leaves (as in flatten_dict) for which pred(path, value) is True in a single traversal.
+
+        Dictionaries emptied by the filter are kept as empty dictionaries, as with del.
+        """
+        return self._transform_leaves(lambda path, value: (pred(path, value), value), inplace)
+
+    def project(self, paths: list[PathKey], copy: bool = False) -> NestedBase:
+        """New object holding only the given paths, built in O(size of the result).
+
+        Args:
+            paths (list[PathKey]): Paths to keep. Branch paths keep their whole subtree. Missing paths raise KeyError.
+            copy (bool): Deep copy the leaves. Otherwise the leaves are shared with this object (the dictionaries are
+                always new). Defaults to False.
+        """
+        index = self._new_index()
+        # With list_paths, the parents of selected list elements are dicts keyed by position until converted back.
+        list_nodes = []
+        new_d = {}
+        for path in paths:
+            path_list = self._split(path)
+            node = self._get_node(path_list)
+            dst = new_d
+            for i, k in enumerate(path_list[:-1]):
+                if isinstance(dst.get(k), list):
+                    # The whole list was selected by an earlier path.
+                    break
+                if not isinstance(dst.get(k), dict):
+                    dst[k] = {}
+                    if self._list_paths and isinstance(self._get_node(path_list[: i + 1]), list):
+                        list_nodes.append((dst, k, dst[k]))
+                dst = dst[k]
+            else:
+                root = {}
+                stack = [(root, path_list[-1], node, path_list)]
+                while stack:
+                    parent, k, v, p = stack.pop()
+                    if isinstance(v, dict) and v:
+                        child = parent[k] = {}
+                        stack.extend((child, ck, cv, p + (ck,)) for ck, cv in reversed(v.items()))
+                        continue
+                    if self._list_paths and isinstance(v, list) and v:
+                        child = parent[k] = [None] * len(v)
+                        stack.extend((child, i, v[i], p + (str(i),)) for i in reversed(range(len(v))))
+                        continue
+                    if copy:
+                        v = deepcopy(v)
+                    elif isinstance(v, dict) or self._list_paths and isinstance(v, list):
+                        v = v.__class__()
+                    parent[k] = v
+                    if index is not None and not list_nodes:
+                        index.update(self._iter_flatten(p, v))
+                dst[path_list[-1]] = root[path_list[-1]]
+
+        if list_nodes:
+            # Deepest first. The selected elements keep their order and are renumbered.
+            for parent, k, node in reversed(list_nodes):
+                if parent[k] is node:
+                    parent[k] = [node[i] for i in sorted(node, key=int)]
+            if index is not None:
+                index.clear()
+                for k, v in new_d.items():
+                    index.update(self._iter_flatten((k,), v))
+
+        states = {"dict": new_d, "delimiter": self._delimiter, "list_paths": self._list_paths}
+        if index is not None:
+            states["flatten_dict"] = index
+        return self.__class__(delimiter=self._delimiter, **self.configs).load_states(states)
 
-        res = [0]
-        traverse(tree=self.dict, res=res, actions=_size_action, depth=max_depth)
-        return res[0]
+    def to_array(self, paths: Optional[list[PathKey]] = None, dtype: Any = None) -> tuple[Any, ArrayLayout]:
+        """Export leaves into a 1-D NumPy array.
+
+        Args:
+            paths (Optional[list[PathKey]]): Leaves to export. Defaults to None, which means all numeric leaves (bool
+                excluded) in depth-first order. That layout is cached until the tree is modified by path.
+            dtype (Any): Array dtype. Defaults to None, which means float64.
+
+        Returns:
+            tuple[numpy.ndarray, ArrayLayout]: The values and the layout to write them back with from_array.
+        """
+        np = import_numpy()
+        if paths is None:
+            layout = self._array_layout
+            if layout is None:
+                path_lists, types = [], []
+                for path_list, v in self._iter_leaves():
+                    if is_numeric(v):
+                        path_lists.append(path_list)
+                        types.append(type(v))
+                layout = self._array_layout = ArrayLayout(path_lists, types, self._delimiter)
+            values = [self._get_node(p) for p in layout.path_lists]
+        else:
+            path_lists = [self._split(p) for p in paths]
+            values = [self._get_node(p) for p in path_lists]
+            for p, v in zip(paths, values):
+                if isinstance(v, dict):
+                    raise TypeError(f"{p} is not a leaf.")
+            layout = ArrayLayout(path_lists, [type(v) for v in values], self._delimiter)
+        return np.asarray(values, dtype=dtype or np.float64), layout
+
+    def from_array(self, array: Any, layout: ArrayLayout) -> NestedBase:
+        """Write the values of a 1-D array back to the leaves of a layout in one pass.
+
+        Values are converted back to the types of the original leaves.
+
+        Returns:
+            NestedBase: self
+        """
+        np = import_numpy()
+        values = np.asarray(array).tolist()
+        if len(values) != len(layout):
+            raise ValueError(f"Expected {len(layout)} values, got {len(values)}.")
+        keys = {p[0] for p in layout.path_lists}
+        self._save_undo(keys)
+        for k in keys:
+            self._children.pop(k, None)
+        if self._resolver is not None:
+            for p in layout.path_lists:
+                self._resolver.invalidate(p)
+        self._write_leaves(layout.path_lists, layout.cast(values))
+        return self
+
+    def size(
+        self, max_depth: int = 1, ignore_none: bool = False, path: Optional[PathKey] = None
+    ) -> int:
+        """Number of leaves and nodes at max_depth.
+
+        Args:
+            max_depth (int): Nodes deeper than max_depth are not counted, dictionaries at max_depth are counted as
+                one. -1 means all depth, where empty dictionaries are not counted. Defaults to 1.
+            ignore_none (bool): Don't count None values. Defaults to False.
+            path (Optional[PathKey]): Count the subtree at path instead of the whole tree. Defaults to None.
+        """
+        tree = self._d if path is None else self._get_node(self._split(path))
+        if self._list_paths and max_depth == -1:
+            # The leaves of flatten_dict, list elements included. Empty lists aren't counted, as empty dictionaries.
+            return sum(
+                1
+                for _, v in self._iter_flatten((), tree)
+                if not (ignore_none and v is None or isinstance(v, (dict, list)) and not v)
+            )
+        if not isinstance(tree, dict):
+            return int(not (ignore_none and tree is None))
+        return self._collect([SizeCollector(max_depth, ignore_none)], tree)[0]
+
+    @contextmanager
+    def batch(self, rollback: bool = False) -> Iterator[NestedBase]:
+        """Group writes. They are applied to the nested dictionary right away, but the index and the resolved
+        references are reconciled once per written subtree when the block exits (or when the index is read inside it).
+
+        Args:
+            rollback (bool): Restore the tree as it was before the block if it raises. Every top level subtree is
+                copied on its first write. Defaults to False.
+
+        Nested blocks join the outermost one.
+        """
+        if self._batch is not None:
+            yield self
+            return
+        self._batch = set()
+        order = None
+        if rollback:
+            self._undo = {}
+            order = list(self._d)
+        try:
+            yield self
+        except BaseException:
+            if rollback:
+                for k, old in self._undo.items():
+                    if old is _MISSING:
+                        self._d.pop(k, None)
+                    else:
+                        self._d[k] = old
+                items = [(k, self._d[k]) for k in order]
+                self._d.clear()
+                self._d.update(items)
+                # Whole tree rewrites (map_leaves, filter_leaves) may have replaced the index, so the derived data
+                # is dropped rather than reconciled.
+                self._batch = set()
+                self._adopt_dict(self._d)
+            raise
+        finally:
+            self._undo = None
+            try:
+                self._flush_batch()
+            finally:
+                self._batch = None
+
+    def resolve(self, path: Optional[PathKey] = None) -> Any:
+        """Value with ${path} references resolved, see naapc.interpolation.
+
+        The reference graph is built on the first call and resolved values are cached. A write through this object
+        only drops the values depending on the written subtree.
+
+        Args:
+            path (Optional[PathKey]): A leaf, or a branch to get a new object of its resolved subtree. Defaults to
+                None, which means a new object of the whole resolved tree. Leaves are shared with this object.
+
+        Raises:
+            ValueError: For circular references.
+            KeyError: For references to missing paths.
+        """
+        if self._batch:
+            self._flush_batch()
+        if self._resolver is None:
+            self._resolver = Resolver(self)
+        prefix = () if path is None else self._split(path)
+        node = self._get_node(prefix)
+        if not isinstance(node, dict):
+            return self._resolver.leaf(prefix, node)
+        n = len(prefix)
+        leaves = ((p[n:], self._resolver.leaf(p, v)) for p, v in self._iter_flatten(prefix, node))
+        if not node:
+            leaves = ()
+        return self.__class__.from_leaves(leaves, delimiter=self._delimiter, **self.configs)
 
     def diff(self, d: Union[NestedBase, dict]) -> dict[str, tuple[Any, Any]]:
         """Compare the leaves."""
-        d = self.__class__(d)
+        d = self.__class__(d, delimiter=self._delimiter, **self.configs)
         d_flatten_dict = d.flatten_dict
         res = {}
         for p, v1 in self.flatten_dict.items():
@@ -234,31 +742,307 @@ class NestedBase(ABC):
         return res
 
     def _get_flatten_dict(self) -> dict[str, Any]:
-        def flatten_action(tree: dict, res: dict, node: Any, path: str, depth: int) -> None:
-            if (path is not None) and (not isinstance(node, dict) or not node):
-                path = path.replace(";", self._delimiter)
-                res[path] = node
+        if self._list_paths:
+            return {self._delimiter.join(p): v for p, v in self._iter_leaves()}
+        return self._collect([FlattenCollector(self._delimiter)])[0]
 
-        res = {}
-        traverse(self.dict, res, flatten_action)
-        return res
+    def _new_collector(self, name: str, max_depth: int, as_tuple: bool, ignore_none: bool) -> Collector:
+        if name == "paths":
+            return PathsCollector(self._delimiter)
+        if name == "flatten_dict":
+            return FlattenCollector(self._delimiter)
+        if name == "keys":
+            return KeysCollector(max_depth, as_tuple, self._delimiter)
+        if name == "values":
+            return ValuesCollector(max_depth, self._dict_nested_conversion_before_return)
+        if name == "size":
+            return SizeCollector(max_depth, ignore_none)
+        raise ValueError(f"Unknown collector: {name}.")
+
+    def _collect(self, collectors: list[Collector], tree: Optional[dict] = None) -> list:
+        """Fill the collectors in one traversal of tree (defaults to the whole tree) and return their results."""
+        depths = [c.max_depth for c in collectors]
+        max_depth = -1 if -1 in depths else max(depths)
+        adds = [(c.max_depth, c.add) for c in collectors]
+
+        def action(tree: dict, res: None, node: Any, path: tuple, depth: int) -> None:
+            if path is None:
+                return
+            for d, add in adds:
+                if d == -1 or depth <= d:
+                    add(node, path, depth)
+
+        traverse(self._d if tree is None else tree, None, TraversalPlan(action, max_depth=max_depth), tuple_paths=True)
+        return [c.result for c in collectors]
+
+    def _normalize_value(self, value: Any) -> Any:
+        """Convert a value into the form stored in the nested dictionary."""
+        if isinstance(value, dict):
+            value = self.__class__(d=value, delimiter=self._delimiter, **self.configs).dict
+        elif isinstance(value, NestedBase):
+            value = value.dict
+        elif self._list_paths and isinstance(value, list):
+            value = [self._normalize_value(x) for x in value]
+        elif isinstance(value, (list, tuple, set)):
+            value = value.__class__(
+                [
+                    self.__class__(d=x).dict if isinstance(x, (NestedBase, dict)) else x
+                    for x in value
+                ]
+            )
+        return value
+
+    def _merge_assign(self, parent: dict, key: str, value: Any, path_list: tuple[str, ...]) -> None:
+        """Set parent[key] = value for merge. Subclasses maintaining extra data should update it here."""
+        self._before_write(path_list)
+        parent[key] = value
+
+    def _invalidate_caches(self, path_list: tuple[str, ...], delete: bool = False) -> None:
+        """Drop cached objects derived from the subtree at path. Must be called before the write or delete."""
+        key = path_list[0]
+        self._children.pop(key, None)
+        self._array_layout = None
+        if self._resolver is not None:
+            self._resolver.invalidate(path_list)
+        if key not in self._d or delete and len(path_list) == 1:
+            self._key_list = None
+
+    def _before_write(self, path_list: tuple[str, ...], delete: bool = False) -> None:
+        """Invalidate the derived data of a subtree about to be written, or record it in a batch."""
+        if self._batch is None:
+            self._invalidate_caches(path_list, delete)
+            return
+        self._batch.add(path_list)
+        key = path_list[0]
+        # Dropping these is O(1), so only the index and the resolver are deferred.
+        self._children.pop(key, None)
+        self._key_list = None
+        self._array_layout = None
+        self._save_undo((key,))
+
+    def _save_undo(self, keys: Iterable[str]) -> None:
+        """Copy the top level subtrees at keys before their first write in a rollback batch."""
+        undo = self._undo
+        if undo is None:
+            return
+        for key in keys:
+            if key not in undo:
+                undo[key] = deepcopy(self._d[key]) if key in self._d else _MISSING
+
+    def _flush_batch(self) -> None:
+        """Reconcile the derived data with the writes of the current batch so far."""
+        touched, self._batch = self._batch, set()
+        # Only the highest written subtrees matter.
+        prefixes = [p for p in touched if not any(p[:i] in touched for i in range(1, len(p)))]
+        if prefixes:
+            self._reconcile(prefixes)
+
+    def _reconcile(self, prefixes: list[tuple[str, ...]]) -> None:
+        """Update the derived data after the subtrees at prefixes were written. Subclasses extend it."""
+        if self._resolver is not None:
+            for p in prefixes:
+                self._resolver.invalidate(p)
+
+    def _clear_caches(self) -> None:
+        self._children.clear()
+        self._key_list = None
+        self._array_layout = None
+        self._resolver = None
+
+    def _top_keys(self) -> list[str]:
+        if self._key_list is None or len(self._key_list) != len(self._d):
+            self._key_list = list(self._d)
+        return self._key_list
+
+    def _iter_leaves(self) -> Iterator[tuple[tuple[str, ...], Any]]:
+        """Yield (split path, leaf) pairs in depth-first order. Empty dictionaries are leaves."""
+        for k, v in self._d.items():
+            yield from self._iter_flatten((k,), v)
+
+    def _transform_leaves(
+        self, transform: Callable[[str, Any], tuple[bool, Any]], inplace: bool
+    ) -> NestedBase:
+        """Rebuild the tree (and the index of subclasses having one) in one traversal.
+
+        transform(path, leaf) returns (keep, new leaf).
+        """
+        if inplace:
+            self._save_undo(list(self._d))
+        index = self._new_index()
+        new_d = self._d if inplace else {}
+        branches = []
+        # path is the one given to transform, new_path the one in the result, which differs below lists (with
+        # list_paths) losing elements to the filter.
+        stack = [(self._d, new_d, (), ())]
+        while stack:
+            src, dst, path, new_path = stack.pop()
+            is_list = isinstance(src, list)
+            if is_list:
+                items = [(str(i), v) for i, v in enumerate(src)]
+                if inplace:
+                    dst = []
+            else:
+                items = list(src.items())
+            for k, v in items:
+                p = path + (k,)
+                q = new_path + (str(len(dst)) if is_list else k,)
+                if v and (isinstance(v, dict) or self._list_paths and isinstance(v, list)):
+                    child = v if inplace else v.__class__()
+                    if is_list:
+                        dst.append(child)
+                    elif not inplace:
+                        dst[k] = child
+                    branches.append((q, child))
+                    stack.append((v, child, p, q))
+                    continue
+                keep, v = transform(self._delimiter.join(p), v)
+                if not keep:
+                    if inplace and not is_list:
+                        del dst[k]
+                    continue
+                if isinstance(v, (dict, NestedBase)) or self._list_paths and isinstance(v, list):
+                    v = self._normalize_value(v)
+                if is_list:
+                    dst.append(v)
+                else:
+                    dst[k] = v
+                if index is not None:
+                    index.update(self._iter_flatten(q, v))
+            if is_list and inplace:
+                src[:] = dst
+        if index is not None:
+            index.update((p, child.__class__()) for p, child in branches if not child)
+
+        states = {"dict": new_d, "delimiter": self._delimiter, "list_paths": self._list_paths}
+        if index is not None:
+            states["flatten_dict"] = index
+        target = self if inplace else self.__class__(delimiter=self._delimiter, **self.configs)
+        return target.load_states(states)
+
+    def _new_index(self) -> Optional[dict]:
+        """Empty index to be filled by _transform_leaves. None if the class doesn't keep an index."""
+        return None
+
+    def _iter_flatten(self, path: tuple[str, ...], node: Any) -> Iterator[tuple[tuple[str, ...], Any]]:
+        """Yield the (split path, leaf) pairs of a node stored at path. Empty dictionaries are leaves."""
+        stack = [(path, node)]
+        while stack:
+            path, node = stack.pop()
+            if isinstance(node, dict) and node:
+                stack.extend((path + (k,), v) for k, v in reversed(node.items()))
+            elif self._list_paths and isinstance(node, list) and node:
+                stack.extend((path + (str(i),), node[i]) for i in reversed(range(len(node))))
+            else:
+                yield path, node
+
+    def _write_leaves(self, path_lists: list[tuple[str, ...]], values: list) -> None:
+        """Overwrite existing leaves without structural changes."""
+        for path_list, v in zip(path_lists, values):
+            _set_child(self._get_node(path_list[:-1]), path_list[-1], v)
+
+    def _adopt_dict(self, d: dict) -> None:
+        """Use a normalized nested dictionary as is."""
+        self._d = d
+        self._clear_caches()
 
     def _init_from_dict(self, d: dict) -> None:
         for k, v in d.items():
             self[k] = v
 
-    def _get_node(self, path: Union[list[str], str]) -> Any:
+    def _split(self, path: PathKey) -> tuple[str, ...]:
+        """Components tuple of a path. Tuples are used as they are, without joining or splitting."""
+        if isinstance(path, str):
+            return split_path(path, self._delimiter)
+        if self._list_paths:
+            return tuple(map(str, path))
+        return tuple(path)
+
+    def _get_node(self, path: PathKey) -> Any:
         """Return the value of a particular path.
 
         Return
             Node value. If the node is a dictionary, __class__(node) will be returned.
         """
-        path_list = path if isinstance(path, list) else path.split(self.delimiter)
-        return reduce(getitem, path_list, self._d)
+        path_list = path if isinstance(path, (list, tuple)) else split_path(path, self._delimiter)
+        if not self._list_paths:
+            return reduce(getitem, path_list, self._d)
+        node = self._d
+        for k in path_list:
+            node = node[_list_index(node, k)] if isinstance(node, list) else node[k]
+        return node
 
     def _dict_nested_conversion_before_return(self, path: str, val: Any) -> Any:
         return (
-            self.__class__.from_states(d=val, delimiter=self.delimiter, **self.configs)
+            self.__class__(delimiter=self.delimiter, **self.configs).load_states(
+                {"dict": val, "delimiter": self.delimiter}
+            )
             if self.return_nested and isinstance(val, dict)
             else val
         )
+
+
+_MISSING = object()
+
+
+def _compile_path_getter(path_list: tuple[str, ...]) -> Callable[[dict], Any]:
+    if len(path_list) == 1:
+        return itemgetter(path_list[0])
+    if len(path_list) == 2:
+        first, second = path_list
+        return lambda d: d[first][second]
+
+    def path_getter(d: dict) -> Any:
+        for k in path_list:
+            d = d[k]
+        return d
+
+    return path_getter
+
+
+def _compile_list_path_getter(path_list: tuple[str, ...]) -> Callable[[dict], Any]:
+    def path_getter(d: dict) -> Any:
+        for k in path_list:
+            d = d[_list_index(d, k)] if isinstance(d, list) else d[k]
+        return d
+
+    return path_getter
+
+
+def _list_index(node: list, key: Union[str, int], append: bool = False) -> int:
+    """Position of the list element addressed by a path component. append allows the position after the end."""
+    try:
+        i = int(key)
+    except (TypeError, ValueError):
+        raise KeyError(key) from None
+    if isinstance(key, str) and str(i) != key or not 0 <= i < len(node) + append:
+        raise KeyError(key)
+    return i
+
+
+def _check_child(parent: Any, path_list: tuple[str, ...]) -> None:
+    """Raise as del parent[key] would, before anything is invalidated."""
+    if not isinstance(parent, dict):
+        raise TypeError(f"'{type(parent).__name__}' object doesn't support item deletion")
+    if path_list[-1] not in parent:
+        raise KeyError(path_list[-1])
+
+
+def _set_child(node: Union[dict, list], key: str, value: Any) -> None:
+    if isinstance(node, list):
+        i = _list_index(node, key, append=True)
+        if i == len(node):
+            node.append(value)
+        else:
+            node[i] = value
+    else:
+        node[key] = value
+
+
+def _restore_lists(d: dict) -> None:
+    """Turn the dictionaries below d keyed by consecutive indexes from "0" into lists, children first."""
+    nodes = [(d, None, None)]
+    for node, _, _ in nodes:
+        nodes.extend((v, node, k) for k, v in node.items() if isinstance(v, dict) and v)
+    for node, parent, key in reversed(nodes[1:]):
+        if all(k == str(i) for i, k in enumerate(node)):
+            parent[key] = list(node.values())
@@ -0,0 +1,107 @@
+"""Collectors of derived views, filled together in a single walk by NestedBase.collect.
+
+A collector receives every node (the root excluded) down to its max_depth through add(node, path, depth), path
+being a components tuple, and exposes what it gathered as result.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable
+
+
+class Collector:
+    """Base collector. max_depth -1 means all depth."""
+
+    def __init__(self, max_depth: int = -1) -> None:
+        self.max_depth = max_depth
+
+    def add(self, node: Any, path: tuple, depth: int) -> None:
+        raise NotImplementedError
+
+    @property
+    def result(self) -> Any:
+        raise NotImplementedError
+
+
+class PathsCollector(Collector):
+    """All paths, internal nodes included."""
+
+    def __init__(self, delimiter: str) -> None:
+        super().__init__()
+        self._join = delimiter.join
+        self._res = []
+
+    def add(self, node: Any, path: tuple, depth: int) -> None:
+        self._res.append(self._join(path))
+
+    @property
+    def result(self) -> list[str]:
+        return self._res
+
+
+class FlattenCollector(Collector):
+    """{path: leaf}, empty dictionaries being leaves."""
+
+    def __init__(self, delimiter: str) -> None:
+        super().__init__()
+        self._join = delimiter.join
+        self._res = {}
+
+    def add(self, node: Any, path: tuple, depth: int) -> None:
+        if not isinstance(node, dict) or not node:
+            self._res[self._join(path)] = node
+
+    @property
+    def result(self) -> dict[str, Any]:
+        return self._res
+
+
+class KeysCollector(Collector):
+    """Paths of the leaves and of the dictionaries at max_depth."""
+
+    def __init__(self, max_depth: int, as_tuple: bool, delimiter: str) -> None:
+        super().__init__(max_depth)
+        self._as_tuple = as_tuple
+        self._join = delimiter.join
+        self._res = []
+
+    def add(self, node: Any, path: tuple, depth: int) -> None:
+        if not isinstance(node, dict) or depth == self.max_depth:
+            self._res.append(path if self._as_tuple else self._join(path))
+
+    @property
+    def result(self) -> list:
+        return self._res
+
+
+class ValuesCollector(Collector):
+    """Values of the leaves and of the dictionaries at max_depth, passed through convert(path, value)."""
+
+    def __init__(self, max_depth: int, convert: Callable[[tuple, Any], Any]) -> None:
+        super().__init__(max_depth)
+        self._convert = convert
+        self._res = []
+
+    def add(self, node: Any, path: tuple, depth: int) -> None:
+        if not isinstance(node, dict) or depth == self.max_depth:
+            self._res.append(self._convert(path, node))
+
+    @property
+    def result(self) -> list:
+        return self._res
+
+
+class SizeCollector(Collector):
+    """Number of leaves and dictionaries at max_depth."""
+
+    def __init__(self, max_depth: int, ignore_none: bool = False) -> None:
+        super().__init__(max_depth)
+        self._ignore_none = ignore_none
+        self._res = 0
+
+    def add(self, node: Any, path: tuple, depth: int) -> None:
+        if (not isinstance(node, dict) or depth == self.max_depth) and not (self._ignore_none and node is None):
+            self._res += 1
+
+    @property
+    def result(self) -> int:
+        return self._res
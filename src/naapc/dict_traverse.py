@@ -1,4 +1,6 @@
-from typing import Any, Callable, Optional, Union
+from __future__ import annotations
+
+from typing import Any, Callable, Iterable, Optional, Union
 
 from .stop_conditions import generate_depth_stop_condition
 
@@ -12,6 +14,7 @@ def dfs(
     depth: int,
     action: Callable,
     stop_condition: Callable,
+    tuple_paths: bool = False,
 ) -> Any:
     """Depth-first traverse.
 
@@ -24,6 +27,7 @@ def dfs(
         depth (int): Current depth (0 at root)
         action (callable): Action.
         stop_condition (callable): Whether should stop the traverse process.
+        tuple_paths (bool): Pass paths as components tuples instead of ";" joined strings. Defaults to False.
 
     Returns:
         Any: Results
@@ -35,28 +39,124 @@ def dfs(
 
     if isinstance(node, dict):
         for k, v in node.items():
-            next_path = k if path is None else ";".join([path, k])
-            dfs(tree, res, v, next_path, depth + 1, action, stop_condition)
+            if tuple_paths:
+                next_path = (k,) if path is None else path + (k,)
+            else:
+                next_path = k if path is None else ";".join([path, k])
+            dfs(tree, res, v, next_path, depth + 1, action, stop_condition, tuple_paths)
     else:
         return res
 
 
+class _PlanNode:
+    __slots__ = ("children", "action", "prune")
+
+    def __init__(self) -> None:
+        self.children = {}
+        self.action = None
+        self.prune = False
+
+
+class TraversalPlan:
+    """Compiled traversal.
+
+    Path actions and pruned paths are placed into a trie following the tree shape, which is walked along with the
+    tree: a node outside the trie gets the default action without any lookup, and a subtree outside the trie isn't
+    visited at all if there is no default action. Pruned subtrees (the node included) are never visited.
+
+    Args:
+        default_action (Optional[callable]): Action of the nodes without a path action. Same signature as the
+            actions of traverse. Defaults to None, which means no action.
+        actions (Optional[dict[PathKey, callable]]): {path: action}. String paths are split by delimiter, the root
+            isn't addressable. Defaults to None.
+        prune (Iterable[PathKey]): Paths of the subtrees to skip. Defaults to ().
+        max_depth (int): Maximum depth, the root being 0. Defaults to -1, which means all depth.
+        stop_condition (Optional[Union[list[callable], callable]]): Extra conditions as in traverse, evaluated on
+            every visited node. Prefer prune and max_depth, which cost nothing. Defaults to None.
+        delimiter (str): Separator of string paths. Defaults to ";".
+    """
+
+    def __init__(
+        self,
+        default_action: Optional[Callable] = None,
+        actions: Optional[dict[Union[str, tuple], Callable]] = None,
+        prune: Iterable[Union[str, tuple]] = (),
+        max_depth: int = -1,
+        stop_condition: Optional[Union[list[Callable], Callable]] = None,
+        delimiter: str = ";",
+    ) -> None:
+        self.default_action = default_action
+        self.max_depth = max_depth
+        self.delimiter = delimiter
+        self._stop_condition = (
+            None if stop_condition is None else _generate_stop_condition_pipeline(stop_condition)
+        )
+        self._root = _PlanNode()
+        for path, action in (actions or {}).items():
+            self._insert(path).action = action
+        for path in prune:
+            self._insert(path).prune = True
+
+    def run(self, tree: dict, res: Any, tuple_paths: bool = False) -> Any:
+        """Traverse tree depth-first in the same order as dfs and return res."""
+        default_action, max_depth, stop_condition = self.default_action, self.max_depth, self._stop_condition
+        stack = [(tree, None, 0, self._root)]
+        while stack:
+            node, path, depth, plan = stack.pop()
+            if max_depth != -1 and depth > max_depth:
+                continue
+            if stop_condition is not None and stop_condition(res, node, path, depth):
+                continue
+            action = default_action if plan is None or plan.action is None else plan.action
+            if action is not None:
+                action(tree, res, node, path, depth)
+            if not isinstance(node, dict) or plan is None and default_action is None:
+                continue
+
+            children = plan.children if plan is not None else None
+            items = []
+            for k, v in node.items():
+                child = children.get(k) if children else None
+                if child is not None and child.prune:
+                    continue
+                if child is None and default_action is None:
+                    continue
+                if tuple_paths:
+                    next_path = (k,) if path is None else path + (k,)
+                else:
+                    next_path = k if path is None else ";".join([path, k])
+                items.append((v, next_path, depth + 1, child))
+            stack.extend(reversed(items))
+        return res
+
+    def _insert(self, path: Union[str, tuple]) -> _PlanNode:
+        node = self._root
+        for k in path.split(self.delimiter) if isinstance(path, str) else path:
+            child = node.children.get(k)
+            if child is None:
+                child = node.children[k] = _PlanNode()
+            node = child
+        return node
+
+
 def traverse(
     tree: dict,
     res: Any,
-    actions: Union[Callable, tuple[Callable, dict[str, Callable]]],
+    actions: Union[Callable, tuple[Callable, dict[str, Callable]], TraversalPlan],
     depth: int = -1,
     stop_condition: Optional[Union[list[Callable], Callable]] = None,
     alg: Callable = dfs,
+    tuple_paths: bool = False,
 ) -> Any:
     """Go through nodes in the tree and apply actions / collect data.
 
     Args:
         res (Any): Where the final results will be.
-        actions (Union[callable, tuple[callable, dict[str, callable]]]): action applied on all nodes or A tuple of
-            (default action, {path: path actions}). Each callable should accept: tree, res, node, path, depth 5
-            arguments. If the dictionary is modified, the action function must also update the flatten dictionary at
-            the same time.
+        actions (Union[callable, tuple[callable, dict[str, callable]], TraversalPlan]): action applied on all nodes
+            or A tuple of (default action, {path: path actions}). Each callable should accept: tree, res, node, path,
+            depth 5 arguments. If the dictionary is modified, the action function must also update the flatten
+            dictionary at the same time. A TraversalPlan carries its own actions, depth and stop conditions, so
+            depth, stop_condition and alg are ignored.
         depth (Optional[int], optional): Maximum traverse depth. Defaults to -1, which means traverse all depth.
         stop_condition (Optional[Union[list[callable], callable]], optional): Callable which returns bool to
             determine whether the tranverse should be stopped. This callable should accept res, node, path, depth 4
@@ -64,13 +164,19 @@ def traverse(
             the traverse process. Defaults to None which means no extra conditions other depth.
         alg (callable, optional): Algorithm used to traverse the tree. Currently only support dfs. It should accept
             res, node, path, depth, actions and stop_condition 6 arguments. Defaults to dfs.
+        tuple_paths (bool): Give paths to actions and stop conditions as components tuples instead of ";" joined
+            strings. The algorithm must accept a tuple_paths keyword. Defaults to False.
 
     Returns:
         Any: The results
     """
+    if isinstance(actions, TraversalPlan):
+        return actions.run(tree, res, tuple_paths=tuple_paths)
     action = _generate_action_pipeline(actions)
     stop_condition = _generate_stop_condition_pipeline(stop_condition, depth)
 
+    if tuple_paths:
+        return alg(tree, res, tree, None, 0, action, stop_condition, tuple_paths=True)
     return alg(tree, res, tree, None, 0, action, stop_condition)
 
 
@@ -97,8 +203,8 @@ def _generate_action_pipeline(
 def _generate_stop_condition_pipeline(
     conditions: Optional[Union[list[Callable], Callable]], max_depth: int = -1
 ) -> Callable:
-    conditions = [conditions] if isinstance(conditions, Callable) else conditions
-    conditions = [] if conditions is None else conditions
+    # A new list, the caller's one is left untouched.
+    conditions = [conditions] if isinstance(conditions, Callable) else list(conditions or [])
     conditions.append(generate_depth_stop_condition(max_depth))
 
     def stop_condition_pipeline(res: Any, node: Any, path: str, depth: int) -> bool:
@@ -0,0 +1,59 @@
+"""Streaming (path, value) files.
+
+jsonl files hold one {"path": path, "value": value} object per line. csv and tsv files have a "path" and a "value"
+column, the value being JSON encoded so that its type survives the round trip.
+"""
+from __future__ import annotations
+
+import csv
+import json
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator, Union
+
+FLAT_FORMATS = ["jsonl", "csv", "tsv"]
+_CSV_DELIMITERS = {"csv": ",", "tsv": "\t"}
+
+
+@contextmanager
+def _open(fp: Union[str, Path, IO[str]], mode: str) -> Iterator[IO[str]]:
+    if isinstance(fp, (str, Path)):
+        with open(fp, mode, newline="") as f:
+            yield f
+    else:
+        yield fp
+
+
+def write_flat(rows: Iterable[tuple[str, Any]], fp: Union[str, Path, IO[str]], format: str = "jsonl") -> int:
+    """Write (path, value) rows one at a time. Returns the number of rows."""
+    assert format in FLAT_FORMATS, f"Unknown format: {format}."
+    n = 0
+    with _open(fp, "w") as f:
+        if format == "jsonl":
+            for n, (path, value) in enumerate(rows, 1):
+                f.write(json.dumps({"path": path, "value": value}))
+                f.write("\n")
+        else:
+            writer = csv.writer(f, delimiter=_CSV_DELIMITERS[format], lineterminator="\n")
+            writer.writerow(("path", "value"))
+            for n, (path, value) in enumerate(rows, 1):
+                writer.writerow((path, json.dumps(value)))
+    return n
+
+
+def read_flat(fp: Union[str, Path, IO[str]], format: str = "jsonl") -> Iterator[tuple[str, Any]]:
+    """Yield the (path, value) rows of a file written by write_flat."""
+    assert format in FLAT_FORMATS, f"Unknown format: {format}."
+    with _open(fp, "r") as f:
+        if format == "jsonl":
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row["path"], row["value"]
+        else:
+            reader = csv.reader(f, delimiter=_CSV_DELIMITERS[format])
+            header = next(reader, None)
+            if header is not None and header != ["path", "value"]:
+                raise ValueError(f"Unexpected header: {header}.")
+            for path, value in reader:
+                yield path, json.loads(value)
@@ -0,0 +1,120 @@
+"""Opt-in operation counters and timers.
+
+Instrumentation is disabled by default. Enabling it wraps the instrumented methods of NestedBase and all its
+subclasses (and the traverse function) in place; disabling it restores the original functions, so there is no
+overhead at all when it is turned off.
+"""
+import sys
+from functools import wraps
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+# operation name -> method names on NestedBase subclasses.
+OPERATIONS = {
+    "get": ("__getitem__",),
+    "set": ("__setitem__",),
+    "delete": ("__delitem__",),
+    "flatten": ("_get_flatten_dict", "_build_index"),
+    "subtree": ("_dict_nested_conversion_before_return",),
+    "traverse": (),
+}
+
+_counters = {op: {"calls": 0, "time": 0.0} for op in OPERATIONS}
+_active = {op: 0 for op in OPERATIONS}
+_originals: dict[tuple[Any, str], Callable] = {}
+_hook: Optional[Callable[[str, float], None]] = None
+
+
+def stats(reset: bool = False) -> dict[str, dict[str, float]]:
+    """Snapshot of {operation: {"calls": n, "time": seconds}}.
+
+    Only outermost calls are counted and timed, e.g. the recursive __setitem__ calls made while building a subtree
+    are part of the top level set.
+
+    Args:
+        reset (bool): Reset the counters after taking the snapshot. Defaults to False.
+    """
+    res = {op: dict(counter) for op, counter in _counters.items()}
+    if reset:
+        reset_stats()
+    return res
+
+
+def reset_stats() -> None:
+    for counter in _counters.values():
+        counter["calls"] = 0
+        counter["time"] = 0.0
+
+
+def stats_enabled() -> bool:
+    return bool(_originals)
+
+
+def enable_stats(hook: Optional[Callable[[str, float], None]] = None) -> None:
+    """Start counting and timing operations.
+
+    Args:
+        hook (Optional[callable]): Called as hook(operation, elapsed_seconds) after every counted operation, e.g. to
+            forward the events to a profiler. Defaults to None.
+    """
+    global _hook
+    _hook = hook
+    if _originals:
+        return
+
+    from . import dict_traverse
+    from .base import NestedBase
+
+    for cls in _all_subclasses(NestedBase):
+        for op, names in OPERATIONS.items():
+            for name in names:
+                if name in cls.__dict__:
+                    _patch(cls, name, op)
+
+    traverse = dict_traverse.traverse
+    for module_name, module in list(sys.modules.items()):
+        if module_name.startswith("naapc") and getattr(module, "traverse", None) is traverse:
+            _patch(module, "traverse", "traverse")
+
+
+def disable_stats() -> None:
+    global _hook
+    for (owner, name), func in _originals.items():
+        setattr(owner, name, func)
+    _originals.clear()
+    _hook = None
+
+
+def _patch(owner: Any, name: str, op: str) -> None:
+    func = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+    _originals[(owner, name)] = func
+    setattr(owner, name, _instrument(func, op))
+
+
+def _instrument(func: Callable, op: str) -> Callable:
+    counter = _counters[op]
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if _active[op]:
+            return func(*args, **kwargs)
+        _active[op] += 1
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            _active[op] -= 1
+            counter["calls"] += 1
+            counter["time"] += elapsed
+            if _hook is not None:
+                _hook(op, elapsed)
+
+    return wrapper
+
+
+def _all_subclasses(cls: type) -> list[type]:
+    res = [cls]
+    for sub in cls.__subclasses__():
+        res.extend(c for c in _all_subclasses(sub) if c not in res)
+    return res
@@ -0,0 +1,143 @@
+"""Deduplication of leaves, keys, index paths and optionally whole subtrees across many nested dictionaries."""
+from __future__ import annotations
+
+import sys
+from typing import Any, Optional, Union
+
+from .base import NestedBase
+
+_SCALARS = (str, bytes, int, float, complex, bool, type(None))
+
+
+def _freeze(value: Any) -> Optional[tuple]:
+    """Hashable key telling identical immutable values apart, None for mutable ones.
+
+    The type is part of the key, so 1, 1.0 and True aren't merged. Zero floats keep their sign.
+    """
+    t = type(value)
+    if t in _SCALARS:
+        if t is float and value == 0:
+            return (t, repr(value))
+        return (t, value)
+    if t is tuple or t is frozenset:
+        items = [_freeze(v) for v in value]
+        if None in items:
+            return None
+        return (t, tuple(items) if t is tuple else frozenset(items))
+    return None
+
+
+class InternPool:
+    """Hash-consing pool shared by many nested objects.
+
+    intern() replaces immutable leaves (scalars and tuples or frozensets of them) equal to one seen before with the
+    pooled object, interns the keys and the index paths, and with share_subtrees also replaces whole subtrees equal
+    to one seen before. Only the tree is rewritten, the objects keep working as before.
+
+    Args:
+        share_subtrees (bool): Share identical subtrees made of immutable leaves between objects. The pool keeps its
+            own copy of every such subtree and hands it to the later objects having an equal one, the first object
+            keeps its own. Shared subtrees are read-only: a write through one object would change all of them and
+            leave the others' index stale. Defaults to False.
+    """
+
+    def __init__(self, share_subtrees: bool = False) -> None:
+        self.share_subtrees = share_subtrees
+        self._values = {}
+        self._paths = {}
+        self._subtrees = {}
+        self._saved = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        """Estimated bytes of the duplicates dropped so far, measured with sys.getsizeof."""
+        return self._saved
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "values": len(self._values),
+            "paths": len(self._paths),
+            "subtrees": len(self._subtrees),
+            "saved_bytes": self._saved,
+        }
+
+    def clear(self) -> None:
+        """Forget the pooled objects. Already interned trees are untouched."""
+        self._values.clear()
+        self._paths.clear()
+        self._subtrees.clear()
+
+    def intern(self, obj: Union[NestedBase, dict]) -> Union[NestedBase, dict]:
+        """Deduplicate a nested object (or a plain nested dict) in place. Returns obj."""
+        if isinstance(obj, NestedBase):
+            self._intern_dict(obj._d)
+            obj._clear_caches()
+            index = getattr(obj, "_index", None)
+            if index:
+                # Rebuilt in place, as the index may be shared with other objects holding the same tree.
+                items = [(self._path(p), v) for p, v in obj._iter_leaves()]
+                index.clear()
+                index.update(items)
+        else:
+            self._intern_dict(obj)
+        return obj
+
+    def _path(self, path_list: tuple) -> tuple:
+        pooled = self._paths.setdefault(path_list, path_list)
+        if pooled is not path_list:
+            self._saved += sys.getsizeof(path_list)
+        return pooled
+
+    def _value(self, value: Any) -> tuple[Any, Optional[tuple]]:
+        key = _freeze(value)
+        if key is None:
+            return value, None
+        pooled = self._values.setdefault(key, value)
+        if pooled is not value:
+            self._saved += sys.getsizeof(value)
+        return pooled, key
+
+    def _key(self, k: Any) -> Any:
+        if type(k) is not str:
+            return k
+        interned = sys.intern(k)
+        if interned is not k:
+            self._saved += sys.getsizeof(k)
+        return interned
+
+    def _intern_dict(self, root: dict) -> None:
+        nodes = [(root, None, None)]
+        for node, _, _ in nodes:
+            nodes.extend((v, node, k) for k, v in node.items() if isinstance(v, dict))
+
+        # Children first, so that a node sees the pooled version of its subtrees.
+        sizes, keys = {}, {}
+        for node, parent, k in reversed(nodes):
+            items, frozen = [], []
+            size = sys.getsizeof(node)
+            for key, v in node.items():
+                if isinstance(v, dict):
+                    fk = keys.get(id(v))
+                    size += sizes.get(id(v), 0)
+                else:
+                    v, fk = self._value(v)
+                items.append((self._key(key), v))
+                frozen.append(None if fk is None else (key, fk))
+            node.clear()
+            node.update(items)
+            sizes[id(node)] = size
+
+            if not self.share_subtrees or parent is None or None in frozen:
+                continue
+            key = keys[id(node)] = (dict, tuple(frozen))
+            pooled = self._subtrees.get(key)
+            if pooled is None or pooled != node:
+                # A pooled subtree written through an object sharing it no longer matches its key, replace it.
+                self._subtrees[key] = {
+                    ck: self._subtrees[keys[id(v)]] if isinstance(v, dict) else v for ck, v in node.items()
+                }
+            elif pooled is not node:
+                parent[k] = pooled
+                keys[id(pooled)] = key
+                sizes[id(pooled)] = size
+                self._saved += size
@@ -0,0 +1,188 @@
+"""${path} references between the leaves of a nested object.
+
+A string leaf that is exactly one reference, e.g. "${train;lr}", resolves to the referenced value with its type. Other
+strings containing references, e.g. "run_${train;lr}", get the values formatted in. References point at leaves,
+may be chained and must not form cycles.
+"""
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Any, Iterator
+
+if TYPE_CHECKING:
+    from .base import NestedBase
+
+REFERENCE = re.compile(r"\$\{([^${}]+)\}")
+
+
+class _PathSet:
+    """Set of paths answering which of them are a prefix of, or below, a given path in O(depth + matches)."""
+
+    def __init__(self) -> None:
+        self._paths = set()
+        # {prefix: paths starting with it}
+        self._below = {}
+
+    def __contains__(self, path: tuple) -> bool:
+        return path in self._paths
+
+    def __iter__(self) -> Iterator[tuple]:
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def add(self, path: tuple) -> None:
+        if path in self._paths:
+            return
+        self._paths.add(path)
+        for i in range(len(path) + 1):
+            self._below.setdefault(path[:i], set()).add(path)
+
+    def discard(self, path: tuple) -> None:
+        if path not in self._paths:
+            return
+        self._paths.discard(path)
+        for i in range(len(path) + 1):
+            paths = self._below[path[:i]]
+            paths.discard(path)
+            if not paths:
+                del self._below[path[:i]]
+
+    def cover(self, path: tuple) -> None:
+        """Add path unless it's at or below a path of the set, dropping the paths below it."""
+        if any(path[:i] in self._paths for i in range(len(path) + 1)):
+            return
+        for p in list(self._below.get(path, ())):
+            self.discard(p)
+        self.add(path)
+
+    def related(self, path: tuple) -> list[tuple]:
+        """The paths that are a prefix of path or start with it."""
+        res = [path[:i] for i in range(len(path)) if path[:i] in self._paths]
+        res.extend(self._below.get(path, ()))
+        return res
+
+
+class Resolver:
+    """Reference graph and resolved values of the templates (leaves with references) of one nested object.
+
+    The graph is built on first use. Writes reported through invalidate drop the cached values of the written
+    subtree and of everything depending on it, and the graph is updated for the written subtree only.
+    """
+
+    def __init__(self, nd: NestedBase) -> None:
+        self._nd = nd
+        # {template path: referenced paths}
+        self._refs = None
+        self._templates = _PathSet()
+        # {referenced path: template paths}
+        self._dependents = {}
+        self._referenced = _PathSet()
+        # {template path: resolved value}
+        self._cache = {}
+        # Written subtrees whose templates need a rescan, without the ones below another.
+        self._stale = _PathSet()
+
+    def invalidate(self, path_list: tuple) -> None:
+        """Drop the cached values depending on a subtree about to be written or deleted."""
+        if self._refs is None:
+            return
+        self._stale.cover(path_list)
+        cache, dependents = self._cache, self._dependents
+        queue = self._templates.related(path_list)
+        queue.extend(t for r in self._referenced.related(path_list) for t in dependents[r])
+        seen = set()
+        while queue:
+            p = queue.pop()
+            if p not in seen:
+                seen.add(p)
+                cache.pop(p, None)
+                queue.extend(dependents.get(p, ()))
+
+    def leaf(self, path_list: tuple, raw: Any) -> Any:
+        """Resolved value of the leaf at path_list whose stored value is raw."""
+        self._refresh()
+        if path_list not in self._refs:
+            return raw
+        return self._resolve(path_list)
+
+    def _refresh(self) -> None:
+        nd = self._nd
+        if self._refs is None:
+            self._refs = {}
+            for p, v in nd._iter_leaves():
+                self._add(p, v)
+            return
+        stale, self._stale = self._stale, _PathSet()
+        for prefix in stale:
+            for t in self._templates.related(prefix):
+                self._templates.discard(t)
+                for r in self._refs.pop(t):
+                    ts = self._dependents[r]
+                    ts.discard(t)
+                    if not ts:
+                        del self._dependents[r]
+                        self._referenced.discard(r)
+            try:
+                node = nd._get_node(prefix)
+            except (KeyError, TypeError):
+                continue
+            for p, v in nd._iter_flatten(prefix, node):
+                self._add(p, v)
+
+    def _add(self, path_list: tuple, value: Any) -> None:
+        if not isinstance(value, str) or "${" not in value:
+            return
+        refs = [self._nd._split(m) for m in REFERENCE.findall(value)]
+        if not refs:
+            return
+        self._refs[path_list] = refs
+        self._templates.add(path_list)
+        for r in refs:
+            self._dependents.setdefault(r, set()).add(path_list)
+            self._referenced.add(r)
+
+    def _resolve(self, path_list: tuple) -> Any:
+        """Resolve a template and the templates it depends on in topological order."""
+        cache, refs = self._cache, self._refs
+        visiting = set()
+        stack = [(path_list, False)]
+        while stack:
+            p, expanded = stack.pop()
+            if p in cache:
+                continue
+            if expanded:
+                cache[p] = self._render(p)
+                visiting.discard(p)
+                continue
+            visiting.add(p)
+            stack.append((p, True))
+            for r in refs[p]:
+                if r in visiting:
+                    raise ValueError(f"Circular reference between {self._join(p)} and {self._join(r)}.")
+                if r in refs and r not in cache:
+                    stack.append((r, False))
+        return cache[path_list]
+
+    def _render(self, path_list: tuple) -> Any:
+        template = self._nd._get_node(path_list)
+        match = REFERENCE.fullmatch(template)
+        if match is not None:
+            return self._lookup(path_list, match.group(1))
+        return REFERENCE.sub(lambda m: str(self._lookup(path_list, m.group(1))), template)
+
+    def _lookup(self, path_list: tuple, ref: str) -> Any:
+        r = self._nd._split(ref)
+        if r in self._refs:
+            return self._cache[r]
+        try:
+            value = self._nd._get_node(r)
+        except (KeyError, TypeError):
+            raise KeyError(f"{self._join(path_list)} references the missing path {ref}.") from None
+        if isinstance(value, dict):
+            raise TypeError(f"{self._join(path_list)} references the branch {ref}, not a leaf.")
+        return value
+
+    def _join(self, path_list: tuple) -> str:
+        return self._nd.delimiter.join(path_list)
@@ -1,16 +1,16 @@
 from __future__ import annotations
 
-import json
-from copy import deepcopy
 from typing import Any, Callable, Optional, Union
 
-import yaml
-
-from .base import NestedBase
+from .base import NestedBase, _check_child, _list_index, _set_child
 from .dict_traverse import traverse
+from .path_index import PathIndex, PathKey
 from .stop_conditions import generate_depth_stop_condition
 
 
+_MISSING = object()
+
+
 def in_or_callable(d: Union[ndict, dict], k: Union[str, Callable]) -> bool:
     return isinstance(k, Callable) or isinstance(k, str) and k in d
 
@@ -27,6 +27,11 @@ class ndict(NestedBase):
         d (Optional[Union[ndict, dict]]): If d is a dict, do make sure the path separator is the givein delimiter if
             path is used as key.
         delimiter (str): Path separator. Can be any string.
+        lazy_index (bool): Adopt a dict d as is (no copy, keys are not split by the delimiter) and build the flatten
+            index on the first access that needs it, e.g. flatten_dict or diff. Writes before that only touch the
+            nested dictionary; afterwards the index is kept up to date incrementally. Defaults to False.
+        list_paths (bool): Treat lists as branches. Their elements are addressed by index components, e.g.
+            "layers;3;dim", and take part in flatten_dict, diff and update. Defaults to False.
     """
 
     ALL_MISSING_METHODS = ["ignore", "false", "exception"]
@@ -36,9 +41,16 @@ class ndict(NestedBase):
         d: Optional[Union[dict, NestedBase]] = None,
         delimiter: Optional[str] = None,
         return_nested: bool = True,
+        lazy_index: bool = False,
+        list_paths: bool = False,
     ) -> None:
-        self._flatten_dict = {}
-        super().__init__(d=d, delimiter=delimiter, return_nested=return_nested)
+        # The flatten index. None until first needed for lazily indexed instances.
+        self._index = PathIndex()
+        if lazy_index and isinstance(d, dict):
+            super().__init__(delimiter=delimiter, return_nested=return_nested, list_paths=list_paths)
+            self._adopt_dict(d)
+        else:
+            super().__init__(d=d, delimiter=delimiter, return_nested=return_nested, list_paths=list_paths)
 
     @classmethod
     def from_states(
@@ -48,6 +60,7 @@ class ndict(NestedBase):
         flatten_dict: Optional[dict] = None,
         delimiter: Optional[str] = None,
         return_nested: bool = True,
+        list_paths: bool = False,
     ) -> NestedBase:
         if states is None:
             assert d is not None and delimiter
@@ -57,7 +70,7 @@ class ndict(NestedBase):
                 if flatten_dict is not None
                 else {"dict": d, "delimiter": delimiter}
             )
-        return cls(return_nested=return_nested).load_states(states)
+        return cls(return_nested=return_nested, list_paths=list_paths).load_states(states)
 
     @property
     def raw_is_plain(self) -> bool:
@@ -66,133 +79,260 @@ class ndict(NestedBase):
     @property
     def flatten_dict(self) -> dict[str, Any]:
         """Flattened dictionary of {path: value} pairs."""
-        return self._flatten_dict
-
-    @property
-    def delimiter(self) -> str:
-        return self._delimiter
-
-    @delimiter.setter
-    def delimiter(self, delimiter: str) -> None:
-        if delimiter == self._delimiter:
-            return
-        self._flatten_dict = {
-            p.replace(self._delimiter, delimiter): v for p, v in self.flatten_dict.items()
-        }
-        self._delimiter = delimiter
+        return self._flatten_dict.view(self._delimiter)
 
     def states(self) -> dict:
-        return {"dict": self.dict, "flatten_dict": self.flatten_dict, "delimiter": self.delimiter}
+        return {
+            "dict": self.dict,
+            "flatten_dict": self._flatten_dict,
+            "delimiter": self.delimiter,
+            "list_paths": self._list_paths,
+        }
 
     def load_states(self, states: Union[dict, ndict]) -> NestedBase:
         """The delimiter is only for properly initialize the object."""
-        if "flatten_dict" in states:
-            self._flatten_dict = states["flatten_dict"]
-            delimiter = self.delimiter
+        self._clear_caches()
+        if states.get("list_paths", False) != self._list_paths:
+            # The index was built with the other list mode.
             self._d = states["dict"]
-            self._delimiter = states["delimiter"]
-            self.delimiter = delimiter
+            self._index = None
+        elif "flatten_dict" in states:
+            index = states["flatten_dict"]
+            if not isinstance(index, PathIndex):
+                index = PathIndex.from_flatten_dict(index, states["delimiter"])
+            self._d = states["dict"]
+            self._index = index
         else:
-            tmp = self.__class__(
-                d=states["dict"], delimiter=self.delimiter, return_nested=self.return_nested
-            )
+            tmp = self.__class__(d=states["dict"], delimiter=self.delimiter, **self.configs)
             self._d = tmp.dict
-            self._flatten_dict = tmp.flatten_dict
+            self._index = tmp._index
         return self
 
-    def __delitem__(self, path: str) -> None:
-        path_list = path.split(self._delimiter)
+    def __delitem__(self, path: PathKey) -> None:
+        if self._index is None or self._batch is not None:
+            return super().__delitem__(path)
+        path_list = self._split(path)
         d = self._get_node(path_list[:-1])
-        del d[path_list[-1]]
-        if path:
-            self._flatten_dict = {
-                p: v for p, v in self._flatten_dict.items() if not p.startswith(path)
-            }
-        else:
-            self._flatten_dict = {
-                p: v for p, v in self._flatten_dict.items() if not p.startswith(";") and p != ""
-            }
-        if len(d) == 0:
-            if len(path_list) > 1:
-                parent_path = self._delimiter.join(path_list[:-1])
-                self._flatten_dict[parent_path] = {}
-
-    # TODO A more efficient approach.
-    def __setitem__(self, path: str, value: Any) -> None:
+        if self._list_paths and isinstance(d, list):
+            i = _list_index(d, path_list[-1])
+            self._invalidate_caches(path_list, delete=True)
+            # Later elements shift, so the list is indexed again.
+            self._index_remove(path_list[:-1], d)
+            del d[i]
+            self._index_add(path_list[:-1], d)
+            return
+        _check_child(d, path_list)
+        self._invalidate_caches(path_list, delete=True)
+        self._index_remove(path_list, d.pop(path_list[-1]))
+        if len(d) == 0 and len(path_list) > 1:
+            self._flatten_dict[path_list[:-1]] = {}
+
+    def __setitem__(self, path: PathKey, value: Any) -> None:
         """Update values of the corresponding path.
 
         Args:
-            path (str): Path can be an existed or non-exist path. If it's existed path and the corresponding values is
-                not a dictionary, then the original value will be overwrittern.
+            path (PathKey): Path can be an existed or non-exist path. If it's existed path and the corresponding values
+                is not a dictionary, then the original value will be overwrittern. A tuple (or list) of components
+                is used as is.
             value (Any): The value for that path.
         """
-        assert isinstance(path, str), f"Path can only be str, recieved {type(path)}."
-        path_list = path.split(self._delimiter)
+        assert isinstance(path, (str, tuple, list)), f"Path can only be str or tuple, recieved {type(path)}."
+        if self._index is None or self._batch is not None:
+            return super().__setitem__(path, value)
+        path_list = self._split(path)
+        list_paths = self._list_paths
+        if list_paths:
+            # Check the list positions first, so that a bad one raises before the index is touched.
+            node = self._d
+            for k in path_list:
+                if isinstance(node, list):
+                    j = _list_index(node, k, append=True)
+                    node = node[j] if j < len(node) else None
+                elif isinstance(node, dict):
+                    node = node.get(k)
+                else:
+                    break
+        self._invalidate_caches(path_list)
+        index = self._flatten_dict
 
-        # Adjust dict.
+        # Adjust dict. Overwritten leaves and empty dictionaries on the way are dropped from the index.
         d = self._d
         for i, node in enumerate(path_list[:-1]):
-            if node not in d:
-                d[node] = {}
-            elif not isinstance(d[node], dict):
-                d[node] = {}
-                tmp_p = self._delimiter.join(path_list[: i + 1])
-                del self._flatten_dict[tmp_p]
-            d = d[node]
-
-        to_be_delete_node = [
-            f"{path}{self.delimiter}{k}" for k in self._get_flatten_dict_of_subtree(path).keys()
-        ]
-        for k in to_be_delete_node:
-            del self._flatten_dict[k]
-        parent_path = self.delimiter.join(path_list[:-1])
-        if parent_path in self._flatten_dict:
-            assert (
-                isinstance(self._flatten_dict[parent_path], dict)
-                and not self._flatten_dict[parent_path]
-            )
-            del self._flatten_dict[parent_path]
+            if isinstance(d, list):
+                j = _list_index(d, node, append=True)
+                child = d[j] if j < len(d) else _MISSING
+            else:
+                child = d.get(node, _MISSING)
+            if not (isinstance(child, dict) or list_paths and isinstance(child, list)):
+                if child is not _MISSING:
+                    del index[path_list[: i + 1]]
+                child = {}
+                _set_child(d, node, child)
+            elif not child:
+                index.pop(path_list[: i + 1], None)
+            d = child
+        key = path_list[-1]
+        if isinstance(d, list):
+            j = _list_index(d, key, append=True)
+            if j < len(d):
+                self._index_remove(path_list, d[j])
+        elif key in d:
+            self._index_remove(path_list, d[key])
 
         # Adjust flatten dict.
-        if isinstance(value, Union[dict, ndict]):
-            tmp = ndict(value)
-            d[path_list[-1]] = tmp.dict
-            if tmp.flatten_dict:
-                if path in self._flatten_dict:
-                    del self._flatten_dict[path]
-                for p, v in tmp.flatten_dict.items():
-                    combined_path = self._delimiter.join([path, p])
-                    self._flatten_dict[combined_path] = v
+        if isinstance(value, (dict, NestedBase)):
+            tmp = ndict(value, delimiter=self._delimiter, list_paths=list_paths)
+            value = tmp.dict
+            if tmp._flatten_dict:
+                for p, v in tmp._flatten_dict.items():
+                    index[path_list + p] = v
             else:
-                self._flatten_dict[path] = {}
+                index[path_list] = {}
+        elif list_paths and isinstance(value, list):
+            value = self._normalize_value(value)
+            self._index_add(path_list, value)
         else:
-            d[path_list[-1]] = value
-            self._flatten_dict[path] = value
-
-    def __contains__(self, path: str) -> bool:
-        if path in self.flatten_dict:
-            return True
-        return super().__contains__(path)
-
-    def _get_flatten_dict_of_subtree(self, prefix: str) -> dict[str, Any]:
-        prefix = f"{prefix}{self.delimiter}"
-        return deepcopy(
-            {
-                path[len(prefix) :]: value
-                for path, value in self.flatten_dict.items()
-                if path.startswith(prefix) and len(path) >= len(prefix)
-            }
-        )
+            index[path_list] = value
+        _set_child(d, key, value)
+
+    def __contains__(self, path: PathKey) -> bool:
+        """Leaves and internal nodes are looked up in the index in O(1) once it's built."""
+        index = self._index
+        if index is None or self._batch:
+            return super().__contains__(path)
+        path_list = self._split(path)
+        return path_list in index or index.is_branch(path_list)
+
+    def size(
+        self, max_depth: int = 1, ignore_none: bool = False, path: Optional[PathKey] = None
+    ) -> int:
+        """See NestedBase.size. The full depth size of any subtree is read from the index in O(depth)."""
+        if max_depth != -1 or self._list_paths:
+            # With list_paths, empty lists are leaves of the index but aren't counted.
+            return super().size(max_depth=max_depth, ignore_none=ignore_none, path=path)
+        path_list = () if path is None else self._split(path)
+        if path_list and path_list not in self._flatten_dict:
+            self._get_node(path_list)  # KeyError for missing paths.
+        return self._flatten_dict.count(path_list, ignore_none=ignore_none)
+
+    @property
+    def _flatten_dict(self) -> PathIndex:
+        if self._index is None:
+            self._build_index()
+        elif self._batch:
+            self._flush_batch()
+        return self._index
+
+    def _build_index(self) -> None:
+        """Build the index in one linear pass."""
+        self._index = PathIndex(self._iter_leaves())
+
+    def _adopt_dict(self, d: dict) -> None:
+        """Use a normalized nested dictionary as is. The index is built when first needed."""
+        super()._adopt_dict(d)
+        self._index = None
+
+    def _normalize_value(self, value: Any) -> Any:
+        if not isinstance(value, dict):
+            return super()._normalize_value(value)
+        # Split the keys as __setitem__ would, without building the index of a temporary object.
+        res = {}
+        for k, v in value.items():
+            path_list = self._split(k)
+            node = res
+            for c in path_list[:-1]:
+                child = node.get(c)
+                if not isinstance(child, dict):
+                    child = node[c] = {}
+                node = child
+            if isinstance(v, (dict, NestedBase)) or self._list_paths and isinstance(v, list):
+                v = self._normalize_value(v)
+            node[path_list[-1]] = v
+        return res
+
+    def _new_index(self) -> Optional[PathIndex]:
+        return PathIndex()
+
+    def _write_leaves(self, path_lists: list[tuple[str, ...]], values: list) -> None:
+        if self._index is None:
+            return super()._write_leaves(path_lists, values)
+        for path_list, v in zip(path_lists, values):
+            _set_child(self._get_node(path_list[:-1]), path_list[-1], v)
+            self._flatten_dict[path_list] = v
+
+    def _merge_assign(self, parent: dict, key: str, value: Any, path_list: tuple[str, ...]) -> None:
+        if self._index is None or self._batch is not None:
+            return super()._merge_assign(parent, key, value, path_list)
+        if key in parent:
+            self._index_remove(path_list, parent[key])
+        elif len(path_list) > 1:
+            # The parent may be an empty dictionary, which is a leaf of the index.
+            self._flatten_dict.pop(path_list[:-1], None)
+        super()._merge_assign(parent, key, value, path_list)
+        self._index_add(path_list, value)
+
+    def _before_write(self, path_list: tuple[str, ...], delete: bool = False) -> None:
+        batch, index = self._batch, self._index
+        if (
+            batch is not None
+            and index is not None
+            and not any(path_list[:i] in batch for i in range(1, len(path_list) + 1))
+        ):
+            # The first write below a path in a batch drops the entries of the old subtree (and of the leaves and
+            # markers on the way), while it can still be walked. _reconcile adds the new ones back.
+            for i in range(1, len(path_list)):
+                index.pop(path_list[:i], None)
+            try:
+                node = self._get_node(path_list)
+            except (KeyError, TypeError):
+                node = _MISSING
+            if node is not _MISSING:
+                for p, _ in self._iter_flatten(path_list, node):
+                    index.pop(p, None)
+        super()._before_write(path_list, delete)
+
+    def _reconcile(self, prefixes: list[tuple[str, ...]]) -> None:
+        """Add the index entries of the subtrees written in a batch."""
+        super()._reconcile(prefixes)
+        index = self._index
+        if index is None:
+            return
+        for p in prefixes:
+            try:
+                node = self._get_node(p)
+            except (KeyError, TypeError):
+                continue
+            index.update(self._iter_flatten(p, node))
+        # _before_write dropped the ancestors. Those emptied by deletes are leaves, as are those left as leaves by a
+        # failed or rolled back write below them.
+        for p in {p[:i] for p in prefixes for i in range(1, len(p))}:
+            try:
+                node = self._get_node(p)
+            except (KeyError, TypeError):
+                continue
+            if not node or not (isinstance(node, dict) or self._list_paths and isinstance(node, list)):
+                index[p] = node
+
+    def _index_add(self, path_list: tuple[str, ...], node: Any) -> None:
+        """Add the index entries of a node stored at path_list."""
+        self._flatten_dict.update(self._iter_flatten(path_list, node))
+
+    def _index_remove(self, path_list: tuple[str, ...], node: Any) -> None:
+        """Remove the index entries of a node stored at path_list."""
+        for p, _ in self._iter_flatten(path_list, node):
+            self._flatten_dict.pop(p, None)
 
     def _dict_nested_conversion_before_return(self, path: str, val: Any) -> Any:
         if self.return_nested and isinstance(val, dict):
-            return self.from_states(
-                {
-                    "dict": val,
-                    "flatten_dict": self._get_flatten_dict_of_subtree(path),
-                    "delimiter": self.delimiter,
-                },
-                return_nested=self.return_nested,
+            if self._index is None:
+                res = self.__class__(delimiter=self.delimiter, **self.configs)
+                res._adopt_dict(val)
+                return res
+            index = PathIndex()
+            for k, v in val.items():
+                index.update(self._iter_flatten((k,), v))
+            return self.__class__(delimiter=self.delimiter, **self.configs).load_states(
+                {"dict": val, "flatten_dict": index, "delimiter": self.delimiter, "list_paths": self._list_paths}
             )
         else:
             return val
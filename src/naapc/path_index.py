@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Iterable, Optional, Union
+
+# A delimited path string or its components.
+PathKey = Union[str, tuple[str, ...], list[str]]
+
+
+@lru_cache(maxsize=8192)
+def split_path(path: str, delimiter: str) -> tuple[str, ...]:
+    """Split a path into a components tuple. Repeated paths share the same tuple."""
+    return tuple(path.split(delimiter))
+
+
+class PathIndex(dict):
+    """Flatten index of {path components tuple: leaf}.
+
+    Delimited string paths are rendered lazily: view(delimiter) builds a {path string: leaf} dictionary on first use
+    and keeps it up to date with every later write, so switching between delimiters doesn't rebuild anything more
+    than once. The number of leaves (empty dictionaries excluded), of non-None leaves and of entries below every
+    internal node are counted in one pass on the first count() or is_branch() and maintained in O(depth) per write
+    afterwards. Writes must go through __setitem__, __delitem__, pop, update or clear.
+
+    Keys whose components contain the delimiter may render to the same path string, e.g. ("a;b",) and ("a", "b").
+    A view then holds the value of the last written of them, and falls back to another one when it's deleted.
+    """
+
+    def __init__(self, items: Optional[Iterable[tuple[tuple, Any]]] = None) -> None:
+        super().__init__()
+        self._views = {}
+        # {delimiter: {path string: keys rendered to it}} of the path strings shared by several keys.
+        self._collisions = {}
+        # {prefix: [leaves, non-None leaves, entries]} of every internal node, including the root ().
+        self._counts = None
+        if items is not None:
+            self.update(items)
+
+    @classmethod
+    def from_flatten_dict(cls, flatten_dict: dict[str, Any], delimiter: str) -> PathIndex:
+        index = cls((tuple(p.split(delimiter)), v) for p, v in flatten_dict.items())
+        index._views[delimiter] = dict(flatten_dict)
+        return index
+
+    def view(self, delimiter: str) -> dict[str, Any]:
+        """{path string: leaf} dictionary for a delimiter. The same object is returned until the index is cleared."""
+        view = self._views.get(delimiter)
+        if view is None:
+            view = self._views[delimiter] = {delimiter.join(k): v for k, v in self.items()}
+            if len(view) < len(self):
+                groups = {}
+                for k in self:
+                    groups.setdefault(delimiter.join(k), []).append(k)
+                self._collisions[delimiter] = {p: keys for p, keys in groups.items() if len(keys) > 1}
+        return view
+
+    def count(self, prefix: tuple, ignore_none: bool = False) -> int:
+        """Number of leaves at or below prefix, empty dictionaries excluded."""
+        if prefix in self:
+            value = super().__getitem__(prefix)
+            return int(not isinstance(value, dict) and not (ignore_none and value is None))
+        counts = self._get_counts().get(prefix)
+        return 0 if counts is None else counts[1 if ignore_none else 0]
+
+    def is_branch(self, prefix: tuple) -> bool:
+        """Whether prefix is an internal node, i.e. a proper prefix of some entry. O(1) after the first call."""
+        return prefix in self._get_counts()
+
+    def __setitem__(self, key: tuple, value: Any) -> None:
+        new = key not in self
+        if self._counts is not None:
+            if not new:
+                self._count(key, super().__getitem__(key), -1)
+            self._count(key, value, 1)
+        super().__setitem__(key, value)
+        for delimiter, view in self._views.items():
+            path = delimiter.join(key)
+            if new and path in view:
+                self._collide(delimiter, path, key)
+            view[path] = value
+
+    def __delitem__(self, key: tuple) -> None:
+        if self._counts is not None:
+            self._count(key, super().__getitem__(key), -1)
+        super().__delitem__(key)
+        self._view_remove(key)
+
+    def pop(self, key: tuple, *default: Any) -> Any:
+        if key not in self:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        value = super().pop(key)
+        if self._counts is not None:
+            self._count(key, value, -1)
+        self._view_remove(key)
+        return value
+
+    def update(self, items: Iterable[tuple[tuple, Any]] = (), **kwargs) -> None:
+        assert not kwargs, "Keys of a PathIndex are tuples."
+        if isinstance(items, dict):
+            items = items.items()
+        if self._counts is None and not self._views:
+            super().update(items)
+            return
+        for k, v in items:
+            self[k] = v
+
+    def clear(self) -> None:
+        super().clear()
+        self._views.clear()
+        self._collisions.clear()
+        self._counts = None
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
+
+    def __copy__(self) -> PathIndex:
+        return self.__class__(self.items())
+
+    def _collide(self, delimiter: str, path: str, key: tuple) -> None:
+        """Record that the new key renders to a path string already in the view of delimiter. O(n), but rare."""
+        collisions = self._collisions.setdefault(delimiter, {})
+        keys = collisions.get(path)
+        if keys is None:
+            keys = collisions[path] = [k for k in self if k != key and delimiter.join(k) == path]
+        keys.append(key)
+
+    def _view_remove(self, key: tuple) -> None:
+        for delimiter, view in self._views.items():
+            path = delimiter.join(key)
+            collisions = self._collisions.get(delimiter)
+            keys = None if collisions is None else collisions.get(path)
+            if keys is None:
+                del view[path]
+                continue
+            keys.remove(key)
+            view[path] = super().__getitem__(keys[-1])
+            if len(keys) == 1:
+                del collisions[path]
+
+    def _get_counts(self) -> dict[tuple, list[int]]:
+        if self._counts is None:
+            self._counts = {}
+            for k, v in self.items():
+                self._count(k, v, 1)
+        return self._counts
+
+    def _count(self, key: tuple, value: Any, sign: int) -> None:
+        leaf = 0 if isinstance(value, dict) else sign
+        non_none = leaf if value is not None else 0
+        counts = self._counts
+        for i in range(len(key)):
+            prefix = key[:i]
+            c = counts.get(prefix)
+            if c is None:
+                c = counts[prefix] = [0, 0, 0]
+            c[0] += leaf
+            c[1] += non_none
+            c[2] += sign
+            if not c[2]:
+                del counts[prefix]
@@ -0,0 +1,258 @@
+"""Read-only nested dictionaries published in shared memory.
+
+A published tree is a single shared memory block holding a sorted table of leaf paths and the pickled leaves:
+
+    header | delimiter | records (sorted by path) | original order | positions | blobs
+
+Every record points to the encoded path (components joined by NUL) and to the pickled leaf in the blob area. The
+original order table gives the rank of the record of every leaf in the original order, the positions table is its
+inverse.
+Readers binary search the records in place and only unpickle the leaves they access, so attaching workers don't
+hold a copy of the tree.
+"""
+from __future__ import annotations
+
+import pickle
+import struct
+import sys
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+from typing import Any, Iterator, Optional, Union
+
+from .base import NestedBase
+from .ndict import ndict
+from .path_index import PathIndex, PathKey, split_path
+
+_MAGIC = b"NAPC"
+_VERSION = 2
+# magic, version, number of leaves, delimiter size in bytes.
+_HEADER = struct.Struct("<4sHIH")
+# path offset, path size, value offset, value size.
+_RECORD = struct.Struct("<QIQI")
+_ORDER = struct.Struct("<I")
+_SEP = b"\x00"
+
+
+def _encode(path_list: tuple) -> bytes:
+    return _SEP.join(str(k).encode() for k in path_list)
+
+
+class SharedNDict:
+    """Read-only view of a nested dictionary stored in shared memory.
+
+    Use publish to create the block (the publishing process owns it and should unlink it when done) and attach to
+    open it by name, e.g. in worker processes.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool = False) -> None:
+        self._shm = shm
+        self._owner = owner
+        self._buf = shm.buf
+        magic, version, self._n, delimiter_size = _HEADER.unpack_from(self._buf, 0)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"{shm.name} is not a shared nested dictionary.")
+        start = _HEADER.size
+        self._delimiter = bytes(self._buf[start : start + delimiter_size]).decode()
+        self._records_start = start + delimiter_size
+        self._order_start = self._records_start + self._n * _RECORD.size
+        self._positions_start = self._order_start + self._n * _ORDER.size
+
+    @classmethod
+    def publish(
+        cls, d: Union[dict, NestedBase], name: Optional[str] = None, delimiter: Optional[str] = None
+    ) -> SharedNDict:
+        """Copy a tree into a new shared memory block.
+
+        Args:
+            d (Union[dict, NestedBase]): The tree. Later changes of d are not reflected.
+            name (Optional[str]): Name of the block. Defaults to None, which means a random name.
+            delimiter (Optional[str]): Path separator of the readers. Defaults to the delimiter of d.
+        """
+        if not isinstance(d, NestedBase):
+            d = ndict(d, delimiter=delimiter)
+        delimiter = (delimiter or d.delimiter).encode()
+
+        leaves = [(_encode(p), pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)) for p, v in d._iter_leaves()]
+        order = sorted(range(len(leaves)), key=lambda i: leaves[i][0])
+        blobs_start = _HEADER.size + len(delimiter) + len(leaves) * (_RECORD.size + 2 * _ORDER.size)
+        size = blobs_start + sum(len(p) + len(v) for p, v in leaves)
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        buf = shm.buf
+        _HEADER.pack_into(buf, 0, _MAGIC, _VERSION, len(leaves), len(delimiter))
+        buf[_HEADER.size : _HEADER.size + len(delimiter)] = delimiter
+        records_start = _HEADER.size + len(delimiter)
+        order_start = records_start + len(leaves) * _RECORD.size
+        positions_start = order_start + len(leaves) * _ORDER.size
+        ranks = [0] * len(leaves)
+        offset = blobs_start
+        for rank, i in enumerate(order):
+            ranks[i] = rank
+            _ORDER.pack_into(buf, positions_start + rank * _ORDER.size, i)
+            path, value = leaves[i]
+            path_offset, value_offset = offset, offset + len(path)
+            offset = value_offset + len(value)
+            buf[path_offset:value_offset] = path
+            buf[value_offset:offset] = value
+            _RECORD.pack_into(buf, records_start + rank * _RECORD.size, path_offset, len(path), value_offset, len(value))
+        for i, rank in enumerate(ranks):
+            _ORDER.pack_into(buf, order_start + i * _ORDER.size, rank)
+        del buf
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> SharedNDict:
+        """Open a published block by name."""
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def delimiter(self) -> str:
+        return self._delimiter
+
+    @property
+    def flatten_dict(self) -> Mapping:
+        """Read-only {path: leaf} mapping reading the shared block on access, in the original order."""
+        return _SharedFlattenView(self)
+
+    def __getitem__(self, path: PathKey) -> Any:
+        """Leaf value, or a new ndict for a branch path, in the original order."""
+        key = self._key(path)
+        i = self._find(key)
+        if i is not None:
+            return self._value(i)
+        lo, hi = self._prefix_range(key)
+        if lo == hi:
+            raise KeyError(path)
+        index = PathIndex()
+        d = {}
+        strip = len(key) + 1
+        for rank in sorted(range(lo, hi), key=self._position):
+            path_list = tuple(bytes(self._path(rank)[strip:]).decode().split("\x00"))
+            value = self._value(rank)
+            node = d
+            for k in path_list[:-1]:
+                node = node.setdefault(k, {})
+            node[path_list[-1]] = value
+            index[path_list] = value
+        return ndict(delimiter=self._delimiter).load_states(
+            {"dict": d, "flatten_dict": index, "delimiter": self._delimiter}
+        )
+
+    def get(self, path: PathKey, default: Any = None) -> Any:
+        try:
+            return self[path]
+        except KeyError:
+            return default
+
+    def __contains__(self, path: PathKey) -> bool:
+        key = self._key(path)
+        if self._find(key) is not None:
+            return True
+        lo, hi = self._prefix_range(key)
+        return lo < hi
+
+    def __iter__(self) -> Iterator[str]:
+        """Leaf paths in the original order."""
+        for i in range(self._n):
+            yield bytes(self._path(self._rank(i))).decode().replace("\x00", self._delimiter)
+
+    def __repr__(self) -> str:
+        return f"<Shared nested dictionary {self.name} of {self._n} leaves.>"
+
+    def to_ndict(self, delimiter: Optional[str] = None) -> ndict:
+        """Copy the whole tree into a regular ndict."""
+        d = {}
+        for i in range(self._n):
+            rank = self._rank(i)
+            path_list = bytes(self._path(rank)).decode().split("\x00")
+            node = d
+            for k in path_list[:-1]:
+                node = node.setdefault(k, {})
+            node[path_list[-1]] = self._value(rank)
+        res = ndict(delimiter=delimiter or self._delimiter)
+        res._adopt_dict(d)
+        return res
+
+    def close(self) -> None:
+        self._buf = None
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Free the block. Only the publisher should call this, once all readers are done."""
+        self._shm.unlink()
+
+    def __enter__(self) -> SharedNDict:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+        if self._owner:
+            self.unlink()
+
+    def __reduce__(self):
+        return self.__class__.attach, (self.name,)
+
+    def _key(self, path: PathKey) -> bytes:
+        return _encode(split_path(path, self._delimiter) if isinstance(path, str) else tuple(path))
+
+    def _record(self, rank: int) -> tuple[int, int, int, int]:
+        return _RECORD.unpack_from(self._buf, self._records_start + rank * _RECORD.size)
+
+    def _rank(self, i: int) -> int:
+        return _ORDER.unpack_from(self._buf, self._order_start + i * _ORDER.size)[0]
+
+    def _position(self, rank: int) -> int:
+        return _ORDER.unpack_from(self._buf, self._positions_start + rank * _ORDER.size)[0]
+
+    def _path(self, rank: int) -> memoryview:
+        path_offset, path_size, _, _ = self._record(rank)
+        return self._buf[path_offset : path_offset + path_size]
+
+    def _value(self, rank: int) -> Any:
+        _, _, value_offset, value_size = self._record(rank)
+        return pickle.loads(self._buf[value_offset : value_offset + value_size])
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(self._path(mid)) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key: bytes) -> Optional[int]:
+        rank = self._lower_bound(key)
+        if rank < self._n and self._path(rank) == key:
+            return rank
+        return None
+
+    def _prefix_range(self, key: bytes) -> tuple[int, int]:
+        """Ranks of the leaves below key. Children sort right after key since NUL is the smallest byte."""
+        return self._lower_bound(key + _SEP), self._lower_bound(key + b"\x01")
+
+
+class _SharedFlattenView(Mapping):
+    def __init__(self, shared: SharedNDict) -> None:
+        self._shared = shared
+
+    def __getitem__(self, path: str) -> Any:
+        rank = self._shared._find(self._shared._key(path))
+        if rank is None:
+            raise KeyError(path)
+        return self._shared._value(rank)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._shared)
+
+    def __len__(self) -> int:
+        return self._shared._n
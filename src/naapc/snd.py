@@ -13,8 +13,9 @@ class snd(NestedBase):
         d: Optional[Union[dict, NestedBase]] = None,
         delimiter: Optional[str] = None,
         return_nested: bool = True,
+        list_paths: bool = False,
     ) -> None:
-        super().__init__(d=d, delimiter=delimiter, return_nested=return_nested)
+        super().__init__(d=d, delimiter=delimiter, return_nested=return_nested, list_paths=list_paths)
 
     @property
     def raw_is_plain(self) -> bool:
@@ -0,0 +1,186 @@
+"""Columnar storage of many configurations, e.g. the runs of a sweep.
+
+Every leaf path is a column shared by all runs. A column is dictionary encoded: the distinct values are stored once
+and every run holds a 4 bytes code into them, code 0 meaning the path is missing in that run. Queries evaluate
+predicates once per distinct value and then only scan the codes.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+from .base import NestedBase
+from .ndict import ndict
+from .path_index import PathKey, split_path
+
+
+class _Column:
+    """Codes of one path across the runs and its distinct values. values[0] is a placeholder of missing."""
+
+    __slots__ = ("codes", "values", "_lookup")
+
+    def __init__(self, n: int) -> None:
+        self.codes = array("I", bytes(4 * n))
+        self.values = [None]
+        self._lookup = {}
+
+    def encode(self, value: Any) -> int:
+        # Keyed by type as well, so 1, 1.0 and True stay distinct.
+        try:
+            key = (type(value), value)
+            code = self._lookup.get(key)
+        except TypeError:
+            key = (type(value), repr(value))
+            code = self._lookup.get(key)
+        if code is None:
+            code = self._lookup[key] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class NDictTable:
+    """Collection of nested dictionaries stored as columns keyed by leaf path.
+
+    Leaves equal across runs are stored once and shared by the runs rebuilt from the table, so they shouldn't be
+    modified in place.
+
+    Args:
+        configs (Optional[Iterable[Union[dict, NestedBase]]]): Initial runs.
+        delimiter (Optional[str]): Path separator. Defaults to None, which means ndict.DEFAULT_DELIMITER.
+    """
+
+    def __init__(
+        self, configs: Optional[Iterable[Union[dict, NestedBase]]] = None, delimiter: Optional[str] = None
+    ) -> None:
+        self._delimiter = delimiter or ndict.DEFAULT_DELIMITER
+        self._columns: dict[tuple[str, ...], _Column] = {}
+        self._n = 0
+        if configs is not None:
+            self.extend(configs)
+
+    @classmethod
+    def from_ndicts(cls, configs: Iterable[Union[dict, NestedBase]], delimiter: Optional[str] = None) -> NDictTable:
+        return cls(configs, delimiter=delimiter)
+
+    @property
+    def delimiter(self) -> str:
+        return self._delimiter
+
+    @property
+    def paths(self) -> list[str]:
+        """Leaf paths of all runs in first seen order."""
+        return [self._delimiter.join(p) for p in self._columns]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __repr__(self) -> str:
+        return f"<Table of {self._n} nested dictionaries and {len(self._columns)} paths.>"
+
+    def append(self, config: Union[dict, NestedBase]) -> int:
+        """Add a run. Returns its position."""
+        if not isinstance(config, NestedBase):
+            config = ndict(config, delimiter=self._delimiter)
+        n = self._n
+        for path_list, value in config._iter_leaves():
+            column = self._columns.get(path_list)
+            if column is None:
+                column = self._columns[path_list] = _Column(n)
+            column.codes.append(column.encode(value))
+        for column in self._columns.values():
+            if len(column.codes) == n:
+                column.codes.append(0)
+        self._n = n + 1
+        return n
+
+    def extend(self, configs: Iterable[Union[dict, NestedBase]]) -> None:
+        for config in configs:
+            self.append(config)
+
+    def __getitem__(self, i: int) -> ndict:
+        """Rebuild run i."""
+        if not -self._n <= i < self._n:
+            raise IndexError(i)
+        i %= self._n
+        leaves = (
+            (p, column.values[column.codes[i]]) for p, column in self._columns.items() if column.codes[i]
+        )
+        return ndict.from_leaves(leaves, delimiter=self._delimiter)
+
+    def __iter__(self) -> Iterator[ndict]:
+        for i in range(self._n):
+            yield self[i]
+
+    def to_ndicts(self) -> list[ndict]:
+        return list(self)
+
+    def column(self, path: PathKey, default: Any = None) -> list[Any]:
+        """Values of a path in every run, default where it's missing."""
+        column = self._column(path)
+        values = [default] + column.values[1:]
+        return [values[c] for c in column.codes]
+
+    def varying_paths(self) -> list[str]:
+        """Paths whose value (or presence) isn't the same in all runs."""
+        res = []
+        for p, column in self._columns.items():
+            codes = column.codes
+            if codes.count(codes[0]) != self._n:
+                res.append(self._delimiter.join(p))
+        return res
+
+    def group_by(self, path: PathKey, default: Any = None) -> dict[Any, list[int]]:
+        """{value: positions of the runs having it} of a path. Runs missing the path are grouped under default."""
+        column = self._column(path)
+        groups = [[] for _ in column.values]
+        for i, c in enumerate(column.codes):
+            groups[c].append(i)
+        res = {}
+        for value, group in zip([default] + column.values[1:], groups):
+            if group:
+                res.setdefault(value, []).extend(group)
+        return res
+
+    def where(self, path: PathKey, pred: Callable[[Any], bool]) -> list[int]:
+        """Positions of the runs having path with pred(value) true. pred is called once per distinct value."""
+        column = self._column(path)
+        mask = [False] + [bool(pred(v)) for v in column.values[1:]]
+        return [i for i, c in enumerate(column.codes) if mask[c]]
+
+    def filter(self, path: PathKey, pred: Callable[[Any], bool]) -> NDictTable:
+        """New table of the runs selected by where."""
+        return self.select(self.where(path, pred))
+
+    def select(self, positions: Iterable[int]) -> NDictTable:
+        """New table of the given runs, holding only their distinct values. Paths missing in all of them are dropped."""
+        positions = list(positions)
+        res = self.__class__(delimiter=self._delimiter)
+        res._n = len(positions)
+        for p, column in self._columns.items():
+            codes = [column.codes[i] for i in positions]
+            if not any(codes):
+                continue
+            new = res._columns[p] = _Column(0)
+            # Old code -> new code, so that appending to either table doesn't change the other.
+            remap = {0: 0}
+            for c in codes:
+                if c not in remap:
+                    remap[c] = new.encode(column.values[c])
+            new.codes = array("I", [remap[c] for c in codes])
+        return res
+
+    def diff(self, i: int, j: int) -> dict[str, tuple[Any, Any]]:
+        """self[i].diff(self[j]) by comparing codes, without rebuilding the runs. Values of different types differ."""
+        res = {}
+        for p, column in self._columns.items():
+            a, b = column.codes[i], column.codes[j]
+            if a != b:
+                res[self._delimiter.join(p)] = (column.values[a], column.values[b])
+        return res
+
+    def _column(self, path: PathKey) -> _Column:
+        path_list = split_path(path, self._delimiter) if isinstance(path, str) else tuple(path)
+        try:
+            return self._columns[path_list]
+        except KeyError:
+            raise KeyError(path) from None
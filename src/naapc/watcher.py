@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+from .base import NestedBase
+
+
+def load_file(path: Union[str, Path]) -> dict:
+    """Load a .json file with json and anything else with yaml."""
+    with open(path, "r") as f:
+        if str(path).endswith(".json"):
+            import json
+
+            return json.load(f)
+        import yaml
+
+        return yaml.safe_load(f) or {}
+
+
+class ConfigWatcher:
+    """Hot-reload a configuration file into a live nested dictionary.
+
+    The file is polled by modification time and size. On a change it is parsed again, compared with the live tree
+    and only the changed paths are written or deleted, so nested objects and caches of untouched subtrees survive.
+    Subscribers are notified once per changed leaf path.
+
+    Args:
+        nd (NestedBase): The live tree to update.
+        path (Union[str, Path]): The watched file.
+        interval (float): Polling interval in seconds of the background thread. Defaults to 1.0.
+        loader (Optional[callable]): Parses the file into a dict. Defaults to None, which means load_file.
+    """
+
+    def __init__(
+        self,
+        nd: NestedBase,
+        path: Union[str, Path],
+        interval: float = 1.0,
+        loader: Optional[Callable[[Union[str, Path]], dict]] = None,
+    ) -> None:
+        self.nd = nd
+        self.path = Path(path)
+        self.interval = interval
+        self.loader = loader or load_file
+        self.last_error: Optional[Exception] = None
+        self._subscribers = []
+        self._signature = self._stat()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(
+        self, callback: Callable[[str, Any, Any], None], prefix: Optional[str] = None
+    ) -> Callable[[], None]:
+        """Call callback(path, old, new) for every changed leaf (at or below prefix).
+
+        As in diff, a missing value is reported as None.
+
+        Returns:
+            callable: Removes the subscription.
+        """
+        entry = (callback, prefix)
+        self._subscribers.append(entry)
+        return lambda: self._subscribers.remove(entry)
+
+    def poll(self) -> dict[str, tuple[Any, Any]]:
+        """Reload if the file changed since the last load. Returns {path: (old, new)} of the applied changes."""
+        signature = self._stat()
+        if signature == self._signature:
+            return {}
+        changes = self.reload()
+        self._signature = signature
+        return changes
+
+    def reload(self) -> dict[str, tuple[Any, Any]]:
+        """Parse the file and apply the differences to the live tree."""
+        with self._lock:
+            new = self.nd.__class__(self.loader(self.path), delimiter=self.nd.delimiter, **self.nd.configs)
+            changes = self._apply(dict(new._iter_leaves()))
+        for path, (old, value) in changes.items():
+            for callback, prefix in list(self._subscribers):
+                if (
+                    prefix is None
+                    or path == prefix
+                    or path.startswith(f"{prefix}{self.nd.delimiter}")
+                ):
+                    callback(path, old, value)
+        return changes
+
+    def start(self) -> ConfigWatcher:
+        """Poll in a daemon thread. Errors (e.g. a half written file) are kept in last_error and retried."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"ConfigWatcher({self.path})", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> ConfigWatcher:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+
+    def _stat(self) -> Optional[tuple[int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _apply(self, new_leaves: dict[tuple, Any]) -> dict[str, tuple[Any, Any]]:
+        nd = self.nd
+        old_leaves = dict(nd._iter_leaves())
+        new_nodes = {p[:i] for p in new_leaves for i in range(1, len(p))}
+        new_nodes.update(new_leaves)
+        join = nd.delimiter.join
+        changes = {}
+
+        # Delete the highest node of every removed leaf that doesn't exist anymore. A leaf turned into a branch is
+        # overwritten by the writes below.
+        removed = set()
+        for p, v in old_leaves.items():
+            if p in new_leaves:
+                continue
+            changes[join(p)] = (v, None)
+            i = next((i for i in range(1, len(p) + 1) if p[:i] not in new_nodes), None)
+            if i is not None:
+                removed.add(p[:i])
+        for p in removed:
+            if not any(p[:i] in removed for i in range(1, len(p))):
+                del nd[p]
+
+        for p, v in new_leaves.items():
+            old = old_leaves.get(p)
+            if p not in old_leaves or type(old) is not type(v) or old != v:
+                nd[p] = v
+                changes[join(p)] = (old, v)
+        return changes
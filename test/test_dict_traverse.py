@@ -0,0 +1,52 @@
+from naapc.dict_traverse import TraversalPlan, traverse
+
+TREE = {"a": {"b": 1, "c": {"d": 2}}, "e": 3, "f": {"g": {"h": 4}, "i": 5}}
+
+
+def _record(tree, res, node, path, depth):
+    res.append((path, depth))
+
+
+def _mark(tree, res, node, path, depth):
+    res.append(("marked", path))
+
+
+def test_plan_matches_traverse():
+    for tuple_paths in (False, True):
+        for depth in (-1, 0, 1, 2):
+            expected = []
+            traverse(TREE, expected, _record, depth=depth, tuple_paths=tuple_paths)
+            plan = TraversalPlan(_record, max_depth=depth)
+            assert traverse(TREE, [], plan, tuple_paths=tuple_paths) == expected
+            assert plan.run(TREE, [], tuple_paths=tuple_paths) == expected
+
+    expected = []
+    traverse(TREE, expected, (_record, {"a;c": _mark, "f;g;h": _mark}))
+    plan = TraversalPlan(_record, {"a;c": _mark, ("f", "g", "h"): _mark})
+    assert plan.run(TREE, []) == expected
+    assert ("marked", "a;c") in expected and ("a;c;d", 3) in expected
+
+
+def test_plan_pruning():
+    visited = []
+
+    def count(res, node, path, depth):
+        visited.append(path)
+        return False
+
+    res = TraversalPlan(_record, prune=["a;c", "f"], stop_condition=count).run(TREE, [])
+    assert res == [(None, 0), ("a", 1), ("a;b", 2), ("e", 1)]
+    assert visited == [p for p, _ in res]
+
+    # Without a default action only the paths of the plan are visited.
+    visited.clear()
+    res = TraversalPlan(actions={"f;g;h": _mark, "a": _mark}, stop_condition=count).run(TREE, [], tuple_paths=True)
+    assert res == [("marked", ("a",)), ("marked", ("f", "g", "h"))]
+    assert visited == [None, ("a",), ("f",), ("f", "g"), ("f", "g", "h")]
+
+
+def test_stop_conditions_not_mutated():
+    conditions = [lambda res, node, path, depth: False]
+    traverse(TREE, [], _record, stop_condition=conditions, depth=1)
+    TraversalPlan(_record, stop_condition=conditions)
+    assert len(conditions) == 1
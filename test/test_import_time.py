@@ -0,0 +1,24 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCHMARK_DIR = ROOT / "benchmark"
+if str(BENCHMARK_DIR) not in sys.path:
+    sys.path.append(str(BENCHMARK_DIR))
+
+from bench_import import DEFERRED_MODULES, measure_import_time
+
+# Generous enough for slow CI machines. The typical cost is a few milliseconds.
+IMPORT_BUDGET_US = 200_000
+
+
+def test_serializers_are_deferred():
+    imported = measure_import_time()
+    assert "naapc" in imported
+    for module in DEFERRED_MODULES:
+        assert module not in imported
+
+
+def test_import_budget():
+    best = min(measure_import_time()["naapc"][1] for _ in range(3))
+    assert best < IMPORT_BUDGET_US
@@ -0,0 +1,40 @@
+import naapc
+from naapc import ndict, snd
+from naapc.base import NestedBase
+
+
+def test_stats():
+    assert not naapc.instrumentation.stats_enabled()
+    getitem = NestedBase.__getitem__
+    naapc.reset_stats()
+
+    events = []
+    naapc.enable_stats(hook=lambda op, elapsed: events.append(op))
+    try:
+        assert NestedBase.__getitem__ is not getitem
+        for cls in (ndict, snd):
+            d = cls({"a": {"b": 1}, "c": 2})
+            d["a;d"] = 3
+            assert d["a;b"] == 1
+            assert d["a"].dict == {"b": 1, "d": 3}
+            del d["c"]
+            d.paths
+            d.flatten_dict
+    finally:
+        naapc.disable_stats()
+
+    assert NestedBase.__getitem__ is getitem
+    res = naapc.stats(reset=True)
+    assert res["get"]["calls"] == 4
+    assert res["delete"]["calls"] == 2
+    assert res["subtree"]["calls"] == 4
+    assert res["set"]["calls"] >= 2
+    assert res["traverse"]["calls"] >= 2
+    assert res["flatten"]["calls"] == 1
+    assert all(v["time"] >= 0 for v in res.values())
+    assert len(events) == sum(v["calls"] for v in res.values())
+    assert all(v["calls"] == 0 for v in naapc.stats().values())
+
+    # Disabled: nothing is counted.
+    ndict({"a": 1})["a"]
+    assert all(v["calls"] == 0 for v in naapc.stats().values())
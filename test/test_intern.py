@@ -0,0 +1,72 @@
+from naapc import InternPool, ndict, snd
+
+
+def _config(i):
+    # Built at runtime, so equal strings are distinct objects.
+    return {
+        "data": {"path": "/".join(["", "datasets", "imagenet", "train"])},
+        "optim": {"name": "".join(["ad", "am"]), "betas": (0.9, 0.999), "zero": -0.0, "flag": True},
+        "run": {"seed": i, "tags": ["a", "b"]},
+        "one": 1,
+    }
+
+
+def test_intern_values():
+    pool = InternPool()
+    a, b = ndict(_config(0)), ndict(_config(1))
+    assert a["data;path"] is not b["data;path"]
+    assert pool.intern(a) is a
+    assert pool.intern(b) is b
+    assert a["data;path"] is b["data;path"]
+    assert a["optim;betas"] is b["optim;betas"]
+    assert a.dict["optim"] is not b.dict["optim"]
+    assert repr(b["optim;zero"]) == "-0.0"
+    assert b["optim;flag"] is True and b["one"] == 1 and type(b["one"]) is int
+    assert a["run;tags"] is not b["run;tags"]
+    assert pool.saved_bytes > 0
+    assert pool.stats()["subtrees"] == 0
+
+    a_paths = {p: p for p in a._flatten_dict}
+    assert all(a_paths[p] is p for p in b._flatten_dict)
+    assert b.flatten_dict == ndict(_config(1)).flatten_dict
+    b["data;path"] = "x"
+    assert a["data;path"] == "/datasets/imagenet/train"
+    assert b.flatten_dict["data;path"] == "x"
+
+
+def test_intern_subtrees():
+    pool = InternPool(share_subtrees=True)
+    a, b, c = ndict(_config(0)), snd(_config(1)), _config(2)
+    for x in (a, b, c):
+        pool.intern(x)
+    # The first object keeps its own subtrees, the pool hands its copies to the later ones.
+    assert b.dict["optim"] is c["optim"] and a.dict["optim"] is not b.dict["optim"]
+    assert b.dict["data"] is c["data"]
+    assert a.dict["run"] is not c["run"]
+    assert pool.stats()["subtrees"] == 2
+    saved = pool.saved_bytes
+    assert saved > 0
+    assert a == ndict(_config(0))
+    assert b.flatten_dict == snd(_config(1)).flatten_dict
+
+    pool.clear()
+    assert pool.stats()["values"] == 0 and pool.saved_bytes == saved
+
+
+def test_intern_subtrees_after_write():
+    pool = InternPool(share_subtrees=True)
+    a, b, c = (ndict({"opt": {"lr": 0.1, "name": "adam"}, "seed": i}) for i in range(3))
+    pool.intern(a)
+    a["opt;lr"] = 0.5
+    pool.intern(b)
+    assert b["opt;lr"] == 0.1 and b.dict["opt"] is not a.dict["opt"]
+    assert b.flatten_dict == {"opt;lr": 0.1, "opt;name": "adam", "seed": 1}
+
+    # A write through an object sharing the pooled subtree isn't handed to the next one either.
+    pool.intern(c)
+    assert c.dict["opt"] is b.dict["opt"]
+    b.dict["opt"]["lr"] = 0.7
+    d = ndict({"opt": {"lr": 0.1, "name": "adam"}, "seed": 3})
+    pool.intern(d)
+    assert d["opt;lr"] == 0.1 and d.flatten_dict["opt;lr"] == 0.1
+    assert pool.stats()["subtrees"] == 1
@@ -1,11 +1,14 @@
+import io
 import json
+import pickle
 import sys
 from copy import deepcopy
 from pathlib import Path
 
 import pytest
 import yaml
-from naapc import ndict
+from naapc import ndict, disable_stats, enable_stats, reset_stats, stats
+from naapc.collectors import KeysCollector, SizeCollector
 
 ROOT = Path(__file__).resolve().parents[1]
 TEST_SRC_DIR = ROOT / "test"
@@ -477,6 +480,762 @@ def test_contain():
     assert "not exist" not in d
 
 
+def test_compile_getter():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    with open(TEST_ASSET / "init_flatten.json", "r") as f:
+        flatten = json.load(f)
+    paths = list(flatten.keys())
+
+    getter = d.compile_getter(paths)
+    assert getter() == tuple(flatten.values())
+    assert d.compile_getter(paths, bind=False)(d) == getter()
+    assert d.compile_getter(paths, bind=False)(d.dict) == getter()
+
+    d[paths[0]] = "changed"
+    assert getter()[0] == "changed"
+    assert d.compile_getter(["nested"])()[0] is d.dict["nested"]
+
+    with pytest.raises(KeyError):
+        d.compile_getter(["not_exist_path"])()
+
+
+def test_getattr():
+    d = ndict({"train": {"optim": {"lr": 0.1}, "epochs": 10}, "node1": None})
+    assert d.train.optim.lr == 0.1
+    assert d.node1 is None
+    assert isinstance(d.train, ndict)
+    assert d.train is d.train
+    assert d.train.optim is d.train.optim
+    assert d.train.optim.dict is d.dict["train"]["optim"]
+
+    train = d.train
+    d["train;optim;lr"] = 0.2
+    assert d.train is not train
+    assert d.train.optim.lr == 0.2
+    d.train["optim;lr"] = 0.3
+    assert d["train;optim;lr"] == 0.3
+    assert d.train.optim.lr == 0.3
+    train = d.train
+    del d["train;epochs"]
+    assert d.train is not train
+    with pytest.raises(AttributeError):
+        d.train.epochs
+    assert not hasattr(d, "not_exist")
+    assert d.keys() == ["train", "node1"]
+
+    d.return_nested = False
+    assert d.train is d.dict["train"]
+
+
+def test_positional_access():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    d.return_nested = False
+    keys = d.keys()
+    for i in range(len(d)):
+        assert d[i] == d[keys[i]]
+        assert d.get(i) == d[keys[i]]
+    assert d[-1] == d[keys[-1]]
+    assert d[1:3] == [d[k] for k in keys[1:3]]
+    assert d[::-1] == [d[k] for k in reversed(keys)]
+    with pytest.raises(IndexError):
+        d[len(d)]
+
+    assert d._top_keys() is d._top_keys()
+    d["new"] = 1
+    assert d[-1] == 1
+    d["new"] = 2
+    assert d[-1] == 2
+    del d[keys[0]]
+    assert d[0] == d[keys[1]]
+    d["nested;new"] = 1
+    assert d._top_keys() == d.keys()
+
+
+def test_merge():
+    base = {"a": {"b": 1, "c": [1]}, "d": {"e": {}}, "f": 1}
+    other = {"a": {"b": 2, "c": [2], "g": {"h": 1}}, "d;e;i": 3, "f": {"j": 1}, "k": {}}
+
+    d = ndict(deepcopy(base)).merge(deepcopy(other))
+    gt = {"a": {"b": 2, "c": [2], "g": {"h": 1}}, "d": {"e": {"i": 3}}, "f": {"j": 1}, "k": {}}
+    assert d.dict == gt
+    assert d.flatten_dict == ndict(gt).flatten_dict
+
+    d = ndict(deepcopy(base)).merge(deepcopy(other), strategy="keep")
+    gt = {"a": {"b": 1, "c": [1], "g": {"h": 1}}, "d": {"e": {"i": 3}}, "f": 1, "k": {}}
+    assert d.dict == gt
+    assert d.flatten_dict == ndict(gt).flatten_dict
+
+    d = ndict(deepcopy(base)).merge(deepcopy(other), strategy="append")
+    assert d["a;c"] == [1, 2]
+    assert d.flatten_dict == ndict(d.dict).flatten_dict
+
+    d = ndict(deepcopy(base))
+    with pytest.raises(ValueError):
+        d.merge(deepcopy(other), strategy="error")
+    assert d.dict == base
+    d.merge({"a": {"b": 1, "x": 1}}, strategy="error")
+    assert d["a;x"] == 1
+
+    subtree = {"h": {"i": 1}}
+    d = ndict(deepcopy(base))
+    src = ndict({"g": subtree})
+    d.merge(src, copy=False)
+    assert d.dict["g"] is src.dict["g"]
+    d.merge({"i": subtree}, copy=False)
+    assert d.dict["i"] is subtree
+    d.merge(ndict({"h": subtree}))
+    assert d.dict["h"] == subtree and d.dict["h"] is not subtree
+    assert d.flatten_dict == ndict(d.dict).flatten_dict
+
+    # Path keys reaching the same new key are merged as update does.
+    other = {"a": {"b": 1}, "a;c": 2, "e": 1, "e;f": 3, "e;g": 4}
+    gt = ndict({"x": 1})
+    gt.update(other)
+    d = ndict({"x": 1}).merge(other)
+    assert d.dict == gt.dict == {"x": 1, "a": {"b": 1, "c": 2}, "e": {"f": 3, "g": 4}}
+    assert d.flatten_dict == gt.flatten_dict
+    sub = {"b": 1}
+    d = ndict({"x": 1}).merge({"a": sub, "a;c": 2}, copy=False)
+    assert d.dict == {"x": 1, "a": {"b": 1, "c": 2}} and sub == {"b": 1}
+
+    # Later keys see the values planned by earlier ones, as if other's keys were set in order.
+    for other, gt in (({"a": 3, "a;b": None}, {"a": {"b": None}}), ({"a;b": None, "a": 3}, {"a": 3})):
+        d = ndict({"a": {"c": 1}}).merge(other)
+        assert d.dict == gt
+        assert d.flatten_dict == ndict(gt).flatten_dict
+        assert ("a;b" in d) == isinstance(gt["a"], dict)
+
+
+def test_array():
+    np = pytest.importorskip("numpy")
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    numeric = {
+        p: v
+        for p, v in d.flatten_dict.items()
+        if isinstance(v, (int, float)) and not isinstance(v, bool)
+    }
+
+    arr, layout = d.to_array()
+    assert arr.dtype == np.float64
+    assert set(layout.paths) == set(numeric.keys())
+    assert arr.tolist() == [numeric[p] for p in layout.paths]
+    assert d.to_array()[1] is layout
+
+    d.from_array(arr * 2 + 0.4, layout)
+    for p, v in numeric.items():
+        assert d[p] == (round(v * 2 + 0.4) if isinstance(v, int) else v * 2 + 0.4)
+        assert type(d[p]) is type(v)
+    assert d.flatten_dict == ndict(d.dict).flatten_dict
+    assert d.to_array()[1] is layout
+
+    arr, layout = d.to_array(["node3", "nested;node2"], dtype=np.float32)
+    assert arr.dtype == np.float32
+    assert layout.index("nested;node2") == 1
+    d.from_array(np.array([5, 6]), layout)
+    assert d["node3"] == 5 and d["nested;node2"] == 6.0
+
+    d["node3"] = "not numeric"
+    assert "node3" not in d.to_array()[1].paths
+    with pytest.raises(TypeError):
+        d.to_array(["nested"])
+    with pytest.raises(ValueError):
+        d.from_array(np.zeros(3), layout)
+
+
+def test_map_filter_leaves():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        raw = json.load(f)
+    d = ndict(deepcopy(raw))
+    flatten = d.flatten_dict
+
+    d1 = d.map_leaves(str, where=lambda p, v: isinstance(v, int), inplace=False)
+    assert d.flatten_dict == flatten
+    assert d1.flatten_dict == {
+        p: str(v) if isinstance(v, int) else v for p, v in flatten.items()
+    }
+    assert d1.flatten_dict == ndict(d1.dict).flatten_dict
+
+    d2 = d.filter_leaves(lambda p, v: v is not None, inplace=False)
+    assert d2.flatten_dict == {p: v for p, v in flatten.items() if v is not None}
+    assert d2.flatten_dict == ndict(d2.dict).flatten_dict
+
+    d3 = d.filter_leaves(lambda p, v: not p.startswith("nested;double"), inplace=False)
+    assert d3["nested;double"].dict == {}
+    assert d3.flatten_dict == ndict(d3.dict).flatten_dict
+
+    nested = d.dict["nested"]
+    assert d.map_leaves(lambda v: {"x": v}, where=lambda p, v: p == "nested;node1") is d
+    assert d.dict["nested"] is nested
+    assert d["nested;node1;x"] == "this"
+    assert d.filter_leaves(lambda p, v: v is not None) is d
+    assert d.flatten_dict == d2.map_leaves(lambda v: {"x": v}, lambda p, v: p == "nested;node1").flatten_dict
+    assert d.flatten_dict == ndict(d.dict).flatten_dict
+
+
+def test_project():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    paths = ["node6", "nested;node7", "nested;double;node1", "nested;double"]
+    p = d.project(paths)
+    assert isinstance(p, ndict)
+    assert p.dict == {
+        "node6": d["node6"],
+        "nested": {"node7": d.dict["nested"]["node7"], "double": d.dict["nested"]["double"]},
+    }
+    assert p.flatten_dict == ndict(p.dict).flatten_dict
+    assert p.dict["node6"] is d.dict["node6"]
+    assert p.dict["nested"]["double"] is not d.dict["nested"]["double"]
+
+    p = d.project(["node6"], copy=True)
+    assert p["node6"] == d["node6"] and p.dict["node6"] is not d.dict["node6"]
+    assert d.project([]).dict == {}
+    with pytest.raises(KeyError):
+        d.project(["not_exist_path"])
+
+
+def test_delimiter_switch_keeps_index():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    index = d._flatten_dict
+    flatten = d.flatten_dict
+    d.delimiter = "."
+    assert d._flatten_dict is index
+    dot_flatten = d.flatten_dict
+    assert dot_flatten == {p.replace(";", "."): v for p, v in flatten.items()}
+    d.delimiter = ";"
+    assert d.flatten_dict is flatten
+
+    d1 = ndict(d)
+    d1.delimiter = "."
+    assert d1._flatten_dict is index
+    d["nested;new"] = 1
+    assert d1.flatten_dict is dot_flatten
+    assert dot_flatten["nested.new"] == 1
+    del d["nested;new"]
+    assert "nested.new" not in dot_flatten
+
+    d = ndict({"a.b": 1, "a": {"b": 2}})
+    d.delimiter = "."
+    assert d._flatten_dict == {("a.b",): 1, ("a", "b"): 2}
+    assert d["a.b"] == 2
+
+
+def test_tuple_paths():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    with open(TEST_ASSET / "init_flatten.json", "r") as f:
+        flatten = json.load(f)
+
+    for p, v in flatten.items():
+        t = tuple(p.split(";"))
+        assert d[t] == v
+        assert d[list(t)] == v
+        assert d.get(t) == v
+        assert t in d
+    assert ("nested", "double") in d
+    assert ("nested", "not_exist") not in d
+    assert d.get(("nested", "not_exist"), 1) == 1
+
+    d.set_many({("a", "b"): 1, "a;c": 2})
+    d.set_many([(("a", "d", "e"), 3)])
+    assert d.dict["a"] == {"b": 1, "c": 2, "d": {"e": 3}}
+    assert d.flatten_dict == ndict(d.dict).flatten_dict
+    del d[("a", "d", "e")]
+    assert d.dict["a"] == {"b": 1, "c": 2, "d": {}}
+    assert d.flatten_dict == ndict(d.dict).flatten_dict
+
+    assert d.keys(-1, as_tuple=True) == [tuple(p.split(";")) for p in d.keys(-1)]
+    assert d.keys(as_tuple=True) == [(k,) for k in d.keys()]
+    assert [k for k, _ in d.items(2, as_tuple=True)] == d.keys(2, as_tuple=True)
+
+    d.delimiter = "."
+    assert d.keys(-1) == [".".join(t) for t in d.keys(-1, as_tuple=True)]
+    assert d.paths[-1] == "a.d"
+
+
+def test_subtree_size():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    for path in [None, "nested", "nested;double", ("nested", "double"), "node1", "node5"]:
+        for ignore_none in (False, True):
+            sub = d if path is None else d[path]
+            if isinstance(sub, ndict):
+                gt = len([v for v in sub.flatten_dict.values() if v != {} and (v is not None or not ignore_none)])
+            else:
+                gt = int(sub is not None or not ignore_none)
+            assert d.size(-1, ignore_none=ignore_none, path=path) == gt
+    assert d.size(1, path="nested") == len(d["nested"])
+    assert d.size(2, path="nested") == d["nested"].size(2)
+
+    size = d.size(-1, path="nested")
+    d["nested;double;node1"] = {"a": 1, "b": None}
+    assert d.size(-1, path="nested") == size + 1
+    assert d.size(-1, ignore_none=True, path="nested;double;node1") == 1
+    del d["nested;double"]
+    assert d.size(-1, path="nested") == size - 5
+    assert d.size(-1, path="nested") == ndict(d.dict).size(-1, path="nested")
+    with pytest.raises(KeyError):
+        d.size(-1, path="not_exist_path")
+
+
+def test_pickle():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f), delimiter=".")
+    d.return_nested = False
+    payload = pickle.dumps(d)
+    assert b"nested.double" not in payload and b"nested;double" not in payload
+
+    for d1 in (pickle.loads(payload), deepcopy(d)):
+        assert isinstance(d1, ndict)
+        assert d1.delimiter == "." and not d1.return_nested
+        assert d1.dict == d.dict and d1.dict is not d.dict
+        assert d1.flatten_dict == d.flatten_dict
+        assert d1.size(-1, path="nested") == d.size(-1, path="nested")
+        d1["nested.new"] = 1
+        assert "nested.new" not in d
+
+
+def test_lazy_index():
+    raw = {"a": 1, "nested": {"b": {"c": None, "e": {}}, "f": [1, 2]}}
+    eager = ndict(deepcopy(raw))
+    d = ndict(raw, lazy_index=True)
+    assert d.dict is raw
+    assert d._index is None
+    assert d["nested;b;c"] == eager["nested;b;c"]
+    assert "nested;b" in d and "nested;x" not in d
+    sub = d["nested"]
+    assert sub._index is None
+    assert sub.dict is raw["nested"]
+
+    # Writes before the index exists only touch the dictionary.
+    d["nested;new"] = {"x": 1}
+    del d["a"]
+    eager["nested;new"] = {"x": 1}
+    del eager["a"]
+    assert d._index is None
+    assert d.flatten_dict == eager.flatten_dict
+    assert d._index is not None
+
+    # Incremental afterwards.
+    d["nested;new;y"] = 2
+    assert d.flatten_dict["nested;new;y"] == 2
+    assert d.size(-1) == eager.size(-1) + 1
+    assert ndict(deepcopy(d.dict), lazy_index=True).diff(d) == {}
+    assert eager.diff(d) == {"nested;new;y": (None, 2)}
+
+    restored = pickle.loads(pickle.dumps(d))
+    assert restored._index is None
+    assert restored == d
+    assert restored.flatten_dict == d.flatten_dict
+
+
+def test_list_paths():
+    raw = {"layers": [{"dim": i, "act": "relu"} for i in range(1000)], "empty": [], "tags": ["a", "b"]}
+    d = ndict(raw, list_paths=True)
+    assert d["layers;3;dim"] == 3
+    assert d[("layers", 3, "dim")] == 3
+    assert isinstance(d["layers;3"], ndict) and d["layers;3"].list_paths
+    assert d.flatten_dict["tags;1"] == "b"
+    assert d.flatten_dict["empty"] == []
+    assert "layers;999;act" in d and "layers;1000" not in d and "layers;x" not in d
+    assert "layers;03" not in d and "tags;0;x" not in d
+    assert ndict(raw)["layers"] == raw["layers"]
+    assert "layers;3" not in ndict(raw).flatten_dict
+
+    d["layers;3;dim"] = 30
+    d["layers;4"] = {"dim": 40}
+    d["tags;2"] = "c"
+    d["empty;0;x"] = 1
+    assert d.dict["layers"][3] == {"dim": 30, "act": "relu"}
+    assert d.dict["layers"][4] == {"dim": 40}
+    assert d.dict["tags"] == ["a", "b", "c"]
+    assert d.dict["empty"] == [{"x": 1}]
+    with pytest.raises(KeyError):
+        d["tags;5"] = "x"
+
+    flat = d.flatten_dict
+    assert flat["layers;4;dim"] == 40 and "layers;4;act" not in flat
+    assert flat["empty;0;x"] == 1 and "empty" not in flat
+    other = ndict(deepcopy(d.dict), list_paths=True)
+    other["layers;7;act"] = "gelu"
+    assert d.diff(other) == {"layers;7;act": ("relu", "gelu")}
+    d.update({"layers": [{"dim": -1}]})
+    assert d["layers;0"] == {"dim": -1, "act": "relu"}
+
+    del d["tags;0"]
+    assert d.dict["tags"] == ["b", "c"]
+    assert d.flatten_dict["tags;0"] == "b" and "tags;2" not in d.flatten_dict
+    del d["empty;0"]
+    assert d.flatten_dict["empty"] == []
+    assert d.flatten_dict == ndict(deepcopy(d.dict), list_paths=True).flatten_dict
+    assert d.compile_getter(["layers;4;dim", "tags;1"])() == (40, "c")
+
+
+@pytest.mark.parametrize("format", ["jsonl", "csv", "tsv"])
+def test_dump_load_flat(tmp_path, format):
+    d = ndict({"a": {"b": 1, "c": "x,\ty", "e": {}}, "f": [1, None], "g": None, "h": True})
+    assert list(d.iter_flat()) == [("a;b", 1), ("a;c", "x,\ty"), ("a;e", {}), ("f", [1, None]), ("g", None), ("h", True)]
+    assert next(d.iter_flat(as_tuple=True)) == (("a", "b"), 1)
+
+    assert d.dump_flat(tmp_path / "out", format=format) == 6
+    res = ndict.load_flat(tmp_path / "out", format=format)
+    assert isinstance(res, ndict)
+    assert res.dict == d.dict
+    assert res.flatten_dict == d.flatten_dict
+
+    buf = io.StringIO()
+    d.dump_flat(buf, format=format)
+    buf.seek(0)
+    assert ndict.load_flat(buf, format=format).dict == d.dict
+
+    lists = ndict({"l": [{"x": 1}, {"x": 2}]}, list_paths=True)
+    lists.dump_flat(tmp_path / "lists", format=format)
+    assert ndict.load_flat(tmp_path / "lists", format=format, list_paths=True).dict == lists.dict
+    assert ndict.load_flat(tmp_path / "lists", format=format).dict == {"l": {"0": {"x": 1}, "1": {"x": 2}}}
+
+
+def test_resolve():
+    d = ndict(
+        {
+            "train": {"lr": 0.1, "name": "run_${train;lr}"},
+            "sched": {"lr": "${train;lr}", "min_lr": "${sched;lr}", "tag": "${train;name}-${sched;lr}"},
+            "empty": {},
+        }
+    )
+    assert d.resolve("sched;min_lr") == 0.1
+    assert d.resolve("sched;tag") == "run_0.1-0.1"
+    assert d.resolve("train;lr") == 0.1
+    res = d.resolve()
+    assert isinstance(res, ndict)
+    assert res.dict == {
+        "train": {"lr": 0.1, "name": "run_0.1"},
+        "sched": {"lr": 0.1, "min_lr": 0.1, "tag": "run_0.1-0.1"},
+        "empty": {},
+    }
+    assert d.resolve("sched").dict == res.dict["sched"]
+    assert d["sched;lr"] == "${train;lr}"
+
+    # Only the dependents of a write are resolved again.
+    resolver = d._resolver
+    d["train;name"] = "new"
+    assert resolver._cache.keys() == {("sched", "lr"), ("sched", "min_lr")}
+    assert d.resolve("sched;tag") == "new-0.1"
+    d["train;lr"] = 0.5
+    assert d._resolver is resolver
+    assert not resolver._cache
+    assert d.resolve("sched;min_lr") == 0.5
+
+    # Templates written later are picked up.
+    d["sched;warmup"] = {"lr": "${sched;min_lr}"}
+    assert d.resolve("sched;warmup;lr") == 0.5
+    del d["sched;min_lr"]
+    with pytest.raises(KeyError):
+        d.resolve("sched;warmup;lr")
+    d["sched;min_lr"] = "${sched;warmup;lr}"
+    with pytest.raises(ValueError):
+        d.resolve("sched;min_lr")
+    d["sched;min_lr"] = "${train}"
+    with pytest.raises(TypeError):
+        d.resolve("sched;warmup;lr")
+    with pytest.raises(ValueError):
+        ndict({"a": "${a}"}).resolve()
+
+
+def test_collect():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    d["empty"] = {}
+    enable_stats()
+    try:
+        paths, flatten, keys, items, size = d.collect("paths", "flatten_dict", "keys", "items", "size", max_depth=2)
+        assert stats()["traverse"]["calls"] == 1
+    finally:
+        disable_stats()
+        reset_stats()
+    assert paths == d.paths
+    assert flatten == d.flatten_dict
+    assert keys == d.keys(2)
+    assert items == d.items(2)
+    assert size == d.size(2)
+    assert d.collect("size", "values", max_depth=-1, ignore_none=True) == (d.size(-1, ignore_none=True), d.values(-1))
+    assert d.collect(SizeCollector(1), KeysCollector(-1, True, ";")) == (d.size(), d.keys(-1, as_tuple=True))
+    with pytest.raises(ValueError):
+        d.collect("nothing")
+
+
+def _batch_edits(d):
+    d["a;b"] = 1
+    d["a;c;d"] = {"e": 2}
+    d["x"] = "${a;b}"
+    del d["nested;node7"]
+    d["nested;node1;new"] = None
+    del d["a;c"]
+    d["z"] = {}
+    d["z;y"] = 3
+    del d["z;y"]
+    d["node6"] = [1, {"a": 2}]
+
+
+def test_batch():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        raw = json.load(f)
+    expected = ndict(deepcopy(raw))
+    _batch_edits(expected)
+    d = ndict(deepcopy(raw))
+    d.flatten_dict
+    d.resolve()
+    with d.batch() as b:
+        assert b is d
+        _batch_edits(d)
+        assert "nested;node7;node8" not in d and "a;b" in d
+        with d.batch():
+            d["a;b"] = 2
+        assert d._batch
+    assert not d._batch and d._batch is None
+    expected["a;b"] = 2
+    assert d.dict == expected.dict
+    assert d.flatten_dict == expected.flatten_dict
+    assert d.flatten_dict == ndict(deepcopy(d.dict)).flatten_dict
+    assert d.resolve("x") == 2
+    assert d.size(-1) == expected.size(-1)
+
+    # Reads of the index inside the block see the writes.
+    with d.batch():
+        d["q;r"] = 1
+        assert d.flatten_dict["q;r"] == 1
+        del d["q"]
+    assert "q;r" not in d.flatten_dict and "q" not in d
+
+    before = deepcopy(d.dict)
+    flatten = dict(d.flatten_dict)
+    with pytest.raises(RuntimeError):
+        with d.batch(rollback=True):
+            d["a;b"] = {"c": 1}
+            del d["nested;node2"]
+            d["new;key"] = 1
+            del d["node1"]
+            raise RuntimeError
+    assert d.dict == before and list(d.dict) == list(before)
+    assert d.flatten_dict == flatten
+    assert d.resolve("x") == 2
+
+    with pytest.raises(RuntimeError):
+        with d.batch():
+            d["kept"] = 1
+            raise RuntimeError
+    assert d.flatten_dict["kept"] == 1
+
+
+def test_batch_lists():
+    d = ndict({"l": [{"a": 1}, {"a": 2}, {"a": 3}]}, list_paths=True)
+    d.flatten_dict
+    with d.batch():
+        del d["l;0"]
+        d["l;2"] = {"a": 4}
+        d["m"] = []
+    assert d.dict == {"l": [{"a": 2}, {"a": 3}, {"a": 4}], "m": []}
+    assert d.flatten_dict == {"l;0;a": 2, "l;1;a": 3, "l;2;a": 4, "m": []}
+
+
+def test_contain_branches():
+    d = ndict({"a": {"b": {"c": "text", "e": {}}, "f": [1, 2]}, "g": None})
+    for path in ["a", "a;b", "a;b;c", "a;b;e", "a;f", "g", ("a", "b")]:
+        assert path in d
+    # Non-dict intermediates.
+    for path in ["a;b;c;t", "a;b;c;x", "a;f;0", "g;x", "a;b;e;x", "x;y"]:
+        assert path not in d
+
+    d["a;b;e;h"] = 1
+    assert "a;b;e" in d and "a;b;e;h" in d
+    del d["a;b"]
+    assert "a;b" not in d and "a;b;c" not in d and "a" in d
+    d["a;b"] = {"k": {}}
+    assert "a;b;k" in d and "a;b" in d
+    del d["a"]
+    assert "a" not in d and "a;f" not in d and "g" in d
+
+    with d.batch():
+        d["n;m"] = 1
+        assert "n" in d and "n;m" in d
+        del d["n"]
+        assert "n" not in d
+    assert "n" not in d and "g" in d
+
+
+def test_batch_below_leaves():
+    d = ndict({"a": 1, "b": {"c": 2}})
+    d.flatten_dict
+    with pytest.raises(RuntimeError):
+        with d.batch(rollback=True):
+            d["a;x"] = 5
+            raise RuntimeError
+    assert d.dict == {"a": 1, "b": {"c": 2}}
+    assert d.flatten_dict == {"a": 1, "b;c": 2}
+    assert "a" in d
+
+    # A failed write below a leaf keeps the leaf.
+    with d.batch():
+        with pytest.raises((KeyError, TypeError)):
+            del d["b;c;x"]
+        d["a"] = 3
+    assert d.flatten_dict == {"a": 3, "b;c": 2} and "b;c" in d
+
+    # Whole tree rewrites are rolled back too.
+    with pytest.raises(RuntimeError):
+        with d.batch(rollback=True):
+            d.map_leaves(lambda v: {"x": v})
+            d.filter_leaves(lambda p, v: p != "b;c;x")
+            raise RuntimeError
+    assert d.dict == {"a": 3, "b": {"c": 2}}
+    assert d.flatten_dict == {"a": 3, "b;c": 2}
+
+
+def test_list_paths_transforms():
+    raw = {"l": [1, 2, {"a": 3, "b": [4, 5]}], "e": [], "x": {"y": 1}}
+    d = ndict(deepcopy(raw), list_paths=True)
+
+    m = d.map_leaves(lambda v: v * 10, inplace=False)
+    assert m.dict == {"l": [10, 20, {"a": 30, "b": [40, 50]}], "e": [], "x": {"y": 10}}
+    assert m.flatten_dict == ndict(deepcopy(m.dict), list_paths=True).flatten_dict
+
+    # Paths given to the predicate are the ones before the filter, the remaining elements are renumbered.
+    f = d.filter_leaves(lambda p, v: p not in ("l;0", "l;2;b;0"), inplace=False)
+    assert f.dict == {"l": [2, {"a": 3, "b": [5]}], "e": [], "x": {"y": 1}}
+    assert f.flatten_dict == {"l;0": 2, "l;1;a": 3, "l;1;b;0": 5, "e": [], "x;y": 1}
+    assert d.dict == raw
+    f = ndict(deepcopy(raw), list_paths=True)
+    f.filter_leaves(lambda p, v: not p.startswith("l;2;b"))
+    assert f.dict["l"] == [1, 2, {"a": 3, "b": []}]
+    assert f.flatten_dict == ndict(deepcopy(f.dict), list_paths=True).flatten_dict
+
+    p = d.project(["l;1"])
+    assert p.dict == {"l": [2]} and p.flatten_dict == {"l;0": 2}
+    p = d.project(["l;2;b;1", "l;0", "x"])
+    assert p.dict == {"l": [1, {"b": [5]}], "x": {"y": 1}}
+    assert p.flatten_dict == {"l;0": 1, "l;1;b;0": 5, "x;y": 1}
+    p = d.project(["l"])
+    assert p.dict["l"] == raw["l"] and p.dict["l"] is not d.dict["l"]
+
+    assert d.size(-1) == 6 and d.size(-1, path="l;2") == 3
+    assert ndict({"l": [1, 2]}, list_paths=True).size(-1) == 2
+    assert ndict({"l": [1, 2]}).size(-1) == 1
+
+
+def test_resolve_branch_writes():
+    d = ndict({"a": {"b": {"c": 1}}, "t": {"x": "${a;b;c}", "y": "${a;b;c}!"}, "u": "${t;x}"})
+    assert d.resolve("u") == 1 and d.resolve("t;y") == "1!"
+    resolver = d._resolver
+    # Writes above and below the referenced path drop its dependents only.
+    d["a"] = {"b": {"c": 2}}
+    assert not resolver._cache
+    assert d.resolve("u") == 2
+    d["a;b;c"] = 3
+    assert d.resolve("u") == 3 and d.resolve("t;y") == "3!"
+    d["a;d"] = 0
+    assert resolver._cache.keys() == {("t", "x"), ("t", "y"), ("u",)}
+    # Rewriting a branch of templates rescans it.
+    d["t"] = {"x": "${a;d}"}
+    assert d.resolve("u") == 0 and ("t", "y") not in resolver._refs
+    assert resolver._dependents.keys() == {("a", "d"), ("t", "x")}
+    del d["t"]
+    with pytest.raises(KeyError):
+        d.resolve("u")
+    assert resolver._dependents.keys() == {("t", "x")}
+
+    # Repeated writes don't pile up rescans until the next resolve.
+    for i in range(100):
+        d["a;b;c"] = i
+        d[f"a;k{i}"] = i
+    assert len(resolver._stale) == 101
+    d["a"] = {}
+    assert list(resolver._stale) == [("a",)]
+
+
+def test_delete_below_leaf():
+    d = ndict({"a": {"b": 1, "s": "text"}, "l": [1]})
+    d.flatten_dict
+    # Without list_paths, lists are leaves.
+    for path in ["a;b;x", "a;s;t", "l;0"]:
+        with pytest.raises(TypeError):
+            del d[path]
+    with pytest.raises(KeyError):
+        del d["a;x"]
+    with pytest.raises(KeyError):
+        del d["x;y"]
+    assert d.dict == {"a": {"b": 1, "s": "text"}, "l": [1]}
+    assert d.flatten_dict == {"a;b": 1, "a;s": "text", "l": [1]}
+
+
+def test_update_custom_delimiter():
+    d = ndict({"a": {"b": 1}}, delimiter=".")
+    d.update({"a.c": 2, "e": {"f.g": 3}})
+    assert d.dict == {"a": {"b": 1, "c": 2}, "e": {"f": {"g": 3}}}
+    assert d.flatten_dict == {"a.b": 1, "a.c": 2, "e.f.g": 3}
+    assert d.diff({"a.b": 1, "a.c": 4, "e.f.g": 3}) == {"a.c": (2, 4)}
+
+
+def test_list_paths_bad_position():
+    d = ndict({"b": [], "c": [{"x": 1}]}, list_paths=True)
+    d.flatten_dict
+    for path in ["b;a", "b;5", "c;2;x"]:
+        with pytest.raises(KeyError):
+            d[path] = 4
+    d["b;0;1"] = 4
+    d["c;0;x;y;z"] = 4
+    assert d.dict == {"b": [{"1": 4}], "c": [{"x": {"y": {"z": 4}}}]}
+    assert d.flatten_dict == ndict(deepcopy(d.dict), list_paths=True).flatten_dict
+
+    d = ndict({"b": []}, list_paths=True)
+    d.flatten_dict
+    for path in ["b;a", "b;5"]:
+        with pytest.raises(KeyError):
+            d[path] = 4
+    assert "b" in d and d.flatten_dict == {"b": []} and d.size(-1) == 0
+
+
+def test_colliding_path_strings():
+    # ("a;b",) and ("a", "b") both render to "a;b", deleting one leaves the other in flatten_dict.
+    for first, second, left in (
+        (("a;b",), "a;b", {"a;b": 2}),
+        ("a;b", ("a;b",), {"a;b": 1, "a": {}}),
+    ):
+        d = ndict()
+        d[("a;b",)] = 1
+        d["a;b"] = 2
+        assert d.flatten_dict == {"a;b": 2}
+        del d[first]
+        assert d.flatten_dict == left
+        del d[second]
+        assert d.dict == {"a": {}} and d.flatten_dict == {"a": {}}
+
+
+def test_list_paths_tuple_get():
+    d = ndict({"a": [1, {"b": 2}], "c": 3, "m": {"1": 5}}, list_paths=True)
+    # Components are converted to strings as in __contains__ and __setitem__.
+    assert ("m", 1) in d and d[("m", 1)] == 5 and d.get(("m", 1)) == 5
+    assert ("a", 1) in d and d[("a", 0)] == 1 and d[["a", 1, "b"]] == 2
+    assert d.get(("a", 1, "b")) == 2 and d.get(("a", 5), 0) == 0
+    d[("a", 0)] = 4
+    assert d.get(("a", 0)) == 4 and d["a;0"] == 4
+    assert d[1] == 3 and d.get(1) == 3
+    d[("m", 1)] = 6
+    assert d.get(("m", 1)) == 6
+
+
+def test_nested_return_delimiter():
+    d = ndict({"a": {"b": {"c": 1}}}, delimiter=".")
+    d.flatten_dict
+    sub = d["a"]
+    assert sub.delimiter == "." and sub["b.c"] == 1
+    assert sub.flatten_dict == {"b.c": 1}
+    assert d.a.delimiter == "."
+    lazy = ndict({"a": {"b": {"c": 1}}}, delimiter=".", lazy_index=True)
+    assert lazy["a"].delimiter == "." and lazy["a"]["b.c"] == 1
+
+
 if __name__ == "__main__":
     # test_update_no_filting()
     # test_init()
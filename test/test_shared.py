@@ -0,0 +1,76 @@
+import json
+import multiprocessing
+from pathlib import Path
+
+import pytest
+from naapc import SharedNDict, ndict
+
+ROOT = Path(__file__).resolve().parents[1]
+TEST_ASSET = ROOT / "test" / "assets"
+
+
+def _read_in_worker(args):
+    name, paths = args
+    shared = SharedNDict.attach(name)
+    try:
+        return [shared[p] for p in paths], all(p in shared for p in paths)
+    finally:
+        shared.close()
+
+
+def test_shared():
+    with open(TEST_ASSET / "init.json", "r") as f:
+        d = ndict(json.load(f))
+    with open(TEST_ASSET / "init_getitem.json", "r") as f:
+        getitem_gt = json.load(f)
+
+    with SharedNDict.publish(d) as shared:
+        assert shared.delimiter == ";"
+        assert dict(shared.flatten_dict) == d.flatten_dict
+        assert list(shared.flatten_dict) == [";".join(p) for p, _ in d._iter_leaves()]
+        assert shared.flatten_dict == d.flatten_dict
+        for p, gt in getitem_gt.items():
+            v = shared[p]
+            assert (v.dict if isinstance(v, ndict) else v) == gt
+            assert p in shared
+            assert tuple(p.split(";")) in shared
+        assert shared["nested"].flatten_dict == d["nested"].flatten_dict
+        assert "not_exist_path" not in shared
+        assert "nested;node" not in shared
+        assert shared.get("nested;not_exist_path", 1) == 1
+        with pytest.raises(KeyError):
+            shared["nested;node"]
+
+        copy = shared.to_ndict()
+        assert copy == d and copy.flatten_dict == d.flatten_dict
+
+        with pytest.raises(TypeError):
+            shared["node1"] = 1
+
+        paths = list(d.flatten_dict)
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(2) as pool:
+            for values, contained in pool.map(_read_in_worker, [(shared.name, paths)] * 2):
+                assert values == list(d.flatten_dict.values())
+                assert contained
+
+    with SharedNDict.publish({}) as shared:
+        assert len(shared.flatten_dict) == 0
+        assert shared.to_ndict().dict == {}
+
+
+def test_shared_branch_order():
+    d = ndict({"b": {"z": 1, "a": {"y": 2, "c": 3}}, "a": 0})
+    with SharedNDict.publish(d) as shared:
+        branch = shared["b"]
+        assert branch.keys() == ["z", "a"]
+        assert list(branch.flatten_dict) == list(d["b"].flatten_dict) == ["z", "a;y", "a;c"]
+        assert list(shared["b;a"].dict) == ["y", "c"]
+
+
+def test_shared_delimiter():
+    with SharedNDict.publish({"b": {"y": {"z": 1}}}, delimiter=".") as shared:
+        branch = shared["b"]
+        assert branch.delimiter == "."
+        assert branch["y.z"] == 1 and shared["b.y"]["z"] == 1
+        assert branch.flatten_dict == {"y.z": 1}
@@ -0,0 +1,63 @@
+from naapc import NDictTable, ndict
+
+
+def _runs():
+    return [
+        {"train": {"lr": lr, "epochs": 10}, "model": {"name": name}, **({"seed": 1} if i % 2 else {})}
+        for i, (lr, name) in enumerate([(1e-2, "a"), (1e-4, "b"), (1e-4, "a"), (1e-3, "b")])
+    ]
+
+
+def test_table():
+    runs = _runs()
+    table = NDictTable(runs)
+    assert len(table) == 4
+    assert table.paths == ["train;lr", "train;epochs", "model;name", "seed"]
+    assert table.varying_paths() == ["train;lr", "model;name", "seed"]
+    assert table.column("train;lr") == [1e-2, 1e-4, 1e-4, 1e-3]
+    assert table.column(("seed",), default=0) == [0, 1, 0, 1]
+    assert table._columns[("train", "lr")].values == [None, 1e-2, 1e-4, 1e-3]
+
+    assert table.group_by("model;name") == {"a": [0, 2], "b": [1, 3]}
+    assert table.group_by("seed") == {None: [0, 2], 1: [1, 3]}
+    assert table.where("train;lr", lambda v: v < 1e-3) == [1, 2]
+    assert table.where("seed", lambda v: True) == [1, 3]
+
+    sub = table.filter("model;name", lambda v: v == "a")
+    assert len(sub) == 2
+    assert sub.paths == ["train;lr", "train;epochs", "model;name"]
+    assert sub.varying_paths() == ["train;lr"]
+
+    for i in range(4):
+        assert table[i] == ndict(runs[i])
+        for j in range(4):
+            assert table.diff(i, j) == ndict(runs[i]).diff(runs[j])
+    assert table.to_ndicts() == [ndict(r) for r in runs]
+    assert isinstance(table[-1], ndict)
+
+
+def test_table_values():
+    table = NDictTable([{"a": 1, "b": [1, 2], "c": {}}, {"a": 1.0, "b": [1, 2], "c": {}}, {"a": True, "b": [2]}])
+    assert table.column("a") == [1, 1.0, True]
+    assert [type(v) for v in table.column("a")] == [int, float, bool]
+    assert table.group_by("a") == {1: [0, 1, 2]}
+    assert table._columns[("b",)].codes.tolist() == [1, 1, 2]
+    assert table.varying_paths() == ["a", "b", "c"]
+    assert table[2].dict == {"a": True, "b": [2]}
+    assert table[0].dict == {"a": 1, "b": [1, 2], "c": {}}
+    table.append(ndict({"d;e": 1}))
+    assert table.column("d;e") == [None, None, None, 1]
+
+
+def test_table_select_independent():
+    table = NDictTable(_runs())
+    sub = table.select([1, 2])
+    assert sub._columns[("train", "lr")].values == [None, 1e-4]
+    assert sub.column("model;name") == ["b", "a"]
+    sub.append({"train": {"lr": 0.5}, "model": {"name": "c"}})
+    assert sub.column("train;lr") == [1e-4, 1e-4, 0.5]
+    assert table._columns[("train", "lr")].values == [None, 1e-2, 1e-4, 1e-3]
+    seen = []
+    assert table.where("model;name", lambda v: seen.append(v) or v == "c") == []
+    assert seen == ["a", "b"]
+    assert [r.dict for r in table] == _runs()
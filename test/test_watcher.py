@@ -0,0 +1,84 @@
+import json
+import time
+
+import yaml
+from naapc import ndict, snd
+from naapc.watcher import ConfigWatcher
+
+
+def _write(path, d):
+    with open(path, "w") as f:
+        if path.suffix == ".json":
+            json.dump(d, f)
+        else:
+            yaml.safe_dump(d, f)
+
+
+def test_watcher(tmp_path):
+    for cls, name in ((ndict, "config.yaml"), (snd, "config.json")):
+        path = tmp_path / name
+        old = {"train": {"lr": 0.1, "epochs": 10, "optim": {"name": "sgd"}}, "model": {"dim": 8}, "seed": 1}
+        _write(path, old)
+        nd = cls(old)
+        model = nd.model
+        watcher = ConfigWatcher(nd, path)
+        events, train_events = [], []
+        watcher.subscribe(lambda *e: events.append(e))
+        unsubscribe = watcher.subscribe(lambda *e: train_events.append(e), prefix="train")
+        assert watcher.poll() == {}
+
+        new = {"train": {"lr": 0.2, "epochs": 10, "extra": {}}, "model": {"dim": 8}, "seed": {"value": 1}}
+        _write(path, new)
+        changes = watcher.reload()
+        assert changes == {
+            "train;lr": (0.1, 0.2),
+            "train;optim;name": ("sgd", None),
+            "train;extra": (None, {}),
+            "seed": (1, None),
+            "seed;value": (None, 1),
+        }
+        assert nd.dict == new
+        assert nd == cls(new)
+        assert nd.flatten_dict == cls(new).flatten_dict
+        assert nd.model is model
+        assert sorted(events) == sorted((p, o, n) for p, (o, n) in changes.items())
+        assert sorted(train_events) == sorted(e for e in events if e[0].startswith("train;"))
+
+        unsubscribe()
+        _write(path, {"model": {"dim": 16}})
+        time.sleep(0.01)
+        path.touch()
+        assert set(watcher.poll()) == {"model;dim", "train;lr", "train;epochs", "train;extra", "seed;value"}
+        assert nd.dict == {"model": {"dim": 16}}
+        assert watcher.poll() == {}
+        assert len(train_events) == 3
+
+
+def test_watcher_thread(tmp_path):
+    path = tmp_path / "config.yaml"
+    _write(path, {"a": 1})
+    nd = ndict({"a": 1})
+    with ConfigWatcher(nd, path, interval=0.01) as watcher:
+        time.sleep(0.02)
+        _write(path, {"a": 2})
+        deadline = time.time() + 5
+        while nd["a"] != 2 and time.time() < deadline:
+            time.sleep(0.01)
+    assert nd["a"] == 2
+    assert watcher.last_error is None
+
+
+def test_watcher_list_paths(tmp_path):
+    for cls in (ndict, snd):
+        path = tmp_path / "config.json"
+        old = {"layers": [{"dim": 8}, {"dim": 16}], "tags": ["a"]}
+        _write(path, old)
+        nd = cls(old, list_paths=True)
+        watcher = ConfigWatcher(nd, path)
+        events = []
+        watcher.subscribe(lambda *e: events.append(e))
+        _write(path, {"layers": [{"dim": 8}, {"dim": 32}], "tags": ["a"]})
+        assert watcher.reload() == {"layers;1;dim": (16, 32)}
+        assert events == [("layers;1;dim", 16, 32)]
+        assert nd.dict == {"layers": [{"dim": 8}, {"dim": 32}], "tags": ["a"]}
+        assert nd.flatten_dict == cls(nd.dict, list_paths=True).flatten_dict